@@ -23,6 +23,7 @@ Feature: Test HTTP methods for a REST API
         # Failing the test on purpose to see the failure in the report
         Then I expect the HTTP response code of 'GET' to be '200'
         And I expect the response body of 'GET' to be non-empty
+        And I expect the response time of 'GET' to be below '5000' ms
 
     @api_smoke
     Scenario Outline: Test UPDATE call
@@ -41,3 +42,4 @@ Feature: Test HTTP methods for a REST API
         When I send a DELETE HTTP request
         Then I expect the HTTP response code of 'DELETE' to be '200'
         And I expect the response body of 'DELETE' to be empty
+        And I expect the p95 response time of the last '10' calls to be below '5000' ms
@@ -1,6 +1,8 @@
 from assertpy import assert_that
 from pytest_bdd import then, parsers
 
+from main.api.utils.utils import percentile
+
 
 @then(parsers.re("I expect the HTTP response code of '(?P<request_type>.*)' to be '(?P<status_code>.*)'"),
       converters=dict(status_code=int, request_type=str))
@@ -26,3 +28,22 @@ def validate_response_body(context, request_type):
         assert_that(context["put_response"]).is_not_equal_to(None)
     elif request_type == "DELETE":
         assert_that(context["delete_response"]).is_empty()
+
+
+@then(parsers.re("I expect the response time of '(?P<request_type>.*)' to be below '(?P<budget_ms>.*)' ms"),
+      converters=dict(request_type=str, budget_ms=float))
+def validate_response_time(context, request_type, budget_ms):
+    timing = context[f"{request_type.lower()}_timing"]
+    assert_that(timing.total_ms).described_as(f"{request_type} {timing.endpoint} response time (ms)") \
+        .is_less_than(budget_ms)
+
+
+@then(parsers.re("I expect the p(?P<quantile>\\d+) response time of the last '(?P<count>\\d+)' calls to be below "
+                 "'(?P<budget_ms>.*)' ms"),
+      converters=dict(quantile=int, count=int, budget_ms=float))
+def validate_response_time_percentile(context, quantile, count, budget_ms):
+    timings = context.get("timings", [])[-count:]
+    assert_that(timings).described_as("timed calls").is_not_empty()
+    value = percentile(sorted(timing.total_ms for timing in timings), quantile)
+    assert_that(value).described_as(f"p{quantile} response time of the last {len(timings)} calls (ms)") \
+        .is_less_than(budget_ms)
@@ -9,6 +9,11 @@ from main.api.utils.utils import (
 )
 
 
+def store_timing(context, request_type, response):
+    context[f"{request_type}_timing"] = response.timing
+    context.setdefault("timings", []).append(response.timing)
+
+
 @when(parsers.re("I send a POST HTTP request with '(?P<payload>.*)'"),
       converters=dict(payload=str))
 def send_post_request(context, payload, set_headers, set_post_endpoint):
@@ -18,6 +23,7 @@ def send_post_request(context, payload, set_headers, set_post_endpoint):
     )
     context["post_response"] = post_response.json()
     context["post_status_code"] = post_response.status_code
+    store_timing(context, "post", post_response)
 
 
 @when("I send a GET HTTP request")
@@ -25,6 +31,7 @@ def send_get_request(context, set_headers, set_post_endpoint):
     get_response = get_request(api_endpoint=set_post_endpoint, headers=set_headers)
     context["get_response"] = get_response.json()
     context["get_status_code"] = get_response.status_code
+    store_timing(context, "get", get_response)
 
 
 @when(parsers.re("I send a PUT HTTP request with '(?P<payload>.*)'"))
@@ -35,6 +42,7 @@ def send_put_request(context, payload, set_headers, set_delete_endpoint):
     )
     context["put_response"] = put_response.json()
     context["put_status_code"] = put_response.status_code
+    store_timing(context, "put", put_response)
 
 
 @when("I send a DELETE HTTP request")
@@ -42,3 +50,4 @@ def send_delete_request(context, set_headers, set_delete_endpoint):
     delete_response = delete_request(api_endpoint=set_delete_endpoint, headers=set_headers)
     context["delete_response"] = delete_response.json()
     context["delete_status_code"] = delete_response.status_code
+    store_timing(context, "delete", delete_response)
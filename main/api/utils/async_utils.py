@@ -0,0 +1,66 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional
+
+import requests
+
+from main.api.utils.utils import POOL_SIZE, REQUEST_TIMEOUT, make_request
+
+
+class ApiRequest(NamedTuple):
+    method: str
+    api_endpoint: str
+    headers: Optional[Dict] = None
+    payload: Optional[Dict] = None
+
+
+class AsyncApiClient:
+    """Send requests concurrently from asyncio code.
+
+    The requests run on a thread pool, so at most `concurrency` requests are in flight. They are sent
+    through `make_request` with the shared pooled session (or the given one, e.g. from `create_session`),
+    so they are timed, logged and recorded to / replayed from the cassettes like the other requests.
+    """
+
+    def __init__(self, concurrency: int = POOL_SIZE, timeout: float = REQUEST_TIMEOUT,
+                 session: Optional[requests.Session] = None):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.session = session
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="api-client")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        # the session is not closed, it is shared or owned by the caller
+        self._executor.shutdown(wait=True)
+
+    def _send(self, request: ApiRequest) -> requests.Response:
+        return make_request(request.method, request.api_endpoint, request.headers, request.payload,
+                            request_session=self.session, timeout=self.timeout)
+
+    async def request(self, method: str, api_endpoint: str, headers: Dict = None,
+                      payload: Dict = None) -> requests.Response:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._send,
+                                          ApiRequest(method, api_endpoint, headers, payload))
+
+    async def gather(self, requests_: List[ApiRequest], return_exceptions: bool = False) -> List:
+        """Send all the requests concurrently and return the responses in the same order."""
+        return await asyncio.gather(*(self.request(*request) for request in requests_),
+                                    return_exceptions=return_exceptions)
+
+
+def send_concurrent_requests(requests_: List[ApiRequest], concurrency: int = POOL_SIZE,
+                             return_exceptions: bool = False) -> List:
+    """Send the requests concurrently from synchronous code, e.g. a step definition."""
+
+    async def _run():
+        async with AsyncApiClient(concurrency=concurrency) as client:
+            return await client.gather(requests_, return_exceptions=return_exceptions)
+
+    return asyncio.run(_run())
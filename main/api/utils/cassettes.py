@@ -0,0 +1,211 @@
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from main.api.utils.custom_exceptions import InteractionNotRecordedException
+from main.api.utils.logger_config import logger
+
+CASSETTES_DIR = Path("test_data/api/cassettes")
+BODIES_DIR_NAME = "bodies"
+# smaller text bodies are kept in the cassette, the others are stored once (by digest) in the bodies folder
+MAX_INLINE_BODY = 64 * 1024
+# the body is already decoded when it is recorded (lower case, header names are case-insensitive)
+_DROPPED_HEADERS = ("content-encoding", "transfer-encoding", "content-length")
+
+# off: always send the requests, replay: replay the recorded requests and record the others,
+# record: send every request and record the cassettes again, offline: replay only, fail on unrecorded requests
+MODES = ("off", "replay", "record", "offline")
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+def _body_digest(body) -> str:
+    if body is None:
+        return ""
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    return _digest(body) if isinstance(body, bytes) else ""
+
+
+def interaction_key(method: str, url: str, body) -> tuple:
+    return method.upper(), url, _body_digest(body)
+
+
+def cassette_name(test_id: str) -> str:
+    """File name of the cassette of a test, readable but short and unique."""
+    slug = re.sub(r"[^\w.-]+", "_", test_id.split("::")[-1]).strip("_")[:100]
+    return f"{slug}-{_digest(test_id.encode('utf-8'))[:10]}"
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as file:
+        file.write(data)
+    os.replace(tmp_path, path)
+
+
+class Cassette:
+    """The request/response pairs of a test, stored as gzipped JSON lines.
+
+    Requests are matched on method, URL and body digest. A request sent several times replays
+    its recorded responses in order, the last one being repeated once they are used up.
+    """
+
+    def __init__(self, name: str, cassettes_dir: Path = CASSETTES_DIR, load: bool = True):
+        self.path = Path(cassettes_dir) / f"{name}.jsonl.gz"
+        self.bodies_dir = Path(cassettes_dir) / BODIES_DIR_NAME
+        self.interactions: Dict[tuple, List[Dict]] = defaultdict(list)
+        self._played = defaultdict(int)
+        self._recorded: List[Dict] = []
+        self._changed = False
+        if load and self.path.exists():
+            with gzip.open(self.path, "rt", encoding="utf-8") as file:
+                for line in file:
+                    interaction = json.loads(line)
+                    self.interactions[tuple(interaction["key"])].append(interaction)
+
+    def play(self, request: requests.PreparedRequest) -> Optional[requests.Response]:
+        key = interaction_key(request.method, request.url, request.body)
+        interactions = self.interactions.get(key)
+        if not interactions:
+            return None
+        index = min(self._played[key], len(interactions) - 1)
+        self._played[key] += 1
+        interaction = interactions[index]
+        self._recorded.append(interaction)
+        return self._build_response(request, interaction)
+
+    def record(self, request: requests.PreparedRequest, response: requests.Response) -> None:
+        content = response.content or b""
+        interaction = {
+            "key": list(interaction_key(request.method, request.url, request.body)),
+            "status": response.status_code,
+            "reason": response.reason,
+            "headers": {name: value for name, value in response.headers.items() if name.lower() not in _DROPPED_HEADERS},
+        }
+        text = None
+        if len(content) <= MAX_INLINE_BODY:
+            try:
+                text = content.decode("utf-8")
+            except UnicodeDecodeError:
+                pass
+        if text is not None:
+            interaction["body"] = text
+        else:
+            interaction["body_file"] = f"{_digest(content)}.gz"
+            body_path = self.bodies_dir / interaction["body_file"]
+            if not body_path.exists():
+                _write_atomic(body_path, gzip.compress(content, compresslevel=6))
+        self._recorded.append(interaction)
+        self._changed = True
+
+    def save(self) -> None:
+        """Write the interactions used by the test, in the order they happened, when some were recorded."""
+        if not self._changed:
+            return
+        lines = "".join(json.dumps(interaction, separators=(",", ":")) + "\n" for interaction in self._recorded)
+        _write_atomic(self.path, gzip.compress(lines.encode("utf-8"), compresslevel=6))
+        logger.debug(f"Cassette '{self.path}' saved with {len(self._recorded)} interactions")
+
+    def _build_response(self, request: requests.PreparedRequest, interaction: Dict) -> requests.Response:
+        response = requests.Response()
+        response.status_code = interaction["status"]
+        response.reason = interaction["reason"]
+        response.headers = CaseInsensitiveDict(interaction["headers"])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        if "body_file" in interaction:
+            # large bodies are decompressed while they are read
+            response.raw = gzip.open(self.bodies_dir / interaction["body_file"], "rb")
+        else:
+            response.raw = io.BytesIO(interaction["body"].encode("utf-8"))
+        return response
+
+
+class CassetteAdapter(BaseAdapter):
+    """Transport adapter replaying the requests of the current cassette and recording the others
+    through the adapter it wraps."""
+
+    def __init__(self, adapter: BaseAdapter):
+        super().__init__()
+        self.adapter = adapter
+        self.cassette: Optional[Cassette] = None
+        self.mode = "off"
+
+    def send(self, request, **kwargs):
+        cassette = self.cassette
+        if cassette is None:
+            return self.adapter.send(request, **kwargs)
+        if self.mode != "record":
+            response = cassette.play(request)
+            if response is not None:
+                response.connection = self
+                if not kwargs.get("stream"):
+                    # read now, so that the body file is closed right away
+                    response.content
+                    response.raw.close()
+                return response
+            if self.mode == "offline":
+                raise InteractionNotRecordedException(
+                    f"No recorded response for '{request.method} {request.url}' in '{cassette.path}'"
+                )
+        response = self.adapter.send(request, **kwargs)
+        cassette.record(request, response)
+        return response
+
+    def close(self):
+        self.adapter.close()
+
+
+def _cassette_adapters(session: requests.Session) -> List[CassetteAdapter]:
+    adapters = []
+    for prefix in ("https://", "http://"):
+        adapter = session.get_adapter(prefix)
+        if not isinstance(adapter, CassetteAdapter):
+            adapter = CassetteAdapter(adapter)
+            session.mount(prefix, adapter)
+        adapters.append(adapter)
+    return adapters
+
+
+def use_cassette(name: str, mode: str = "replay", session: requests.Session = None,
+                 cassettes_dir: Path = CASSETTES_DIR) -> Optional[Cassette]:
+    """Replay and/or record the requests of the session (by default the one of `make_request`)
+    with the cassette `name` until `eject_cassette` is called."""
+    if mode == "off":
+        return None
+    if session is None:
+        from main.api.utils.utils import session
+    # when re-recording, the previous interactions are not loaded
+    cassette = Cassette(name, cassettes_dir, load=mode != "record")
+    for adapter in _cassette_adapters(session):
+        adapter.cassette, adapter.mode = cassette, mode
+    return cassette
+
+
+def eject_cassette(session: requests.Session = None) -> None:
+    """Stop using the current cassette and save the interactions of the test."""
+    if session is None:
+        from main.api.utils.utils import session
+    cassette = None
+    for adapter in session.adapters.values():
+        if isinstance(adapter, CassetteAdapter):
+            cassette = adapter.cassette if adapter.cassette is not None else cassette
+            adapter.cassette, adapter.mode = None, "off"
+    if cassette is not None:
+        cassette.save()
@@ -37,3 +37,15 @@ class InvalidFileFormatException(GeneralException):
 
     def __init__(self, msg=None):
         super().__init__("INVALID_FILE_FORMAT", msg)
+
+
+class InteractionNotRecordedException(GeneralException):
+    """Exception raised when a request has no recorded response to replay.
+
+    This exception is raised when the API cassettes are replayed offline and
+    the request was not recorded. It takes an optional `msg` argument to
+    provide more information about the error.
+    """
+
+    def __init__(self, msg=None):
+        super().__init__("INTERACTION_NOT_RECORDED", msg)
@@ -0,0 +1,215 @@
+import hashlib
+import json
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+
+from main.api.utils.logger_config import logger
+from main.api.utils.utils import REQUEST_TIMEOUT, create_session, percentile
+
+RecordedRequest = namedtuple("RecordedRequest", "method api_endpoint headers payload status content_type body")
+
+# upper bounds (ms) of the latency histogram buckets, the last bucket has no upper bound
+HISTOGRAM_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class RequestRecorder:
+    """Request listener keeping the requests of a scenario, to replay them under load."""
+
+    def __init__(self):
+        self.requests: List[RecordedRequest] = []
+
+    def __call__(self, method, api_endpoint, headers, payload, response):
+        self.requests.append(RecordedRequest(method.upper(), api_endpoint, headers, payload, response.status_code,
+                                             response.headers.get("Content-Type", ""), response.content))
+
+
+def _body_digest(body) -> str:
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    return hashlib.sha1(body).hexdigest() if body else ""
+
+
+class StubServer:
+    """Local HTTP server answering every recorded request with its recorded response,
+    so a load run does not hit the real API. Requests are matched on method, path with query and body digest."""
+
+    def __init__(self):
+        self._responses: Dict[tuple, RecordedRequest] = {}
+        responses = self._responses
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # headers and body are written separately, without it every response waits for a delayed ACK
+            disable_nagle_algorithm = True
+
+            def _reply(self):
+                length = int(self.headers.get("Content-Length", 0) or 0)
+                body = self.rfile.read(length) if length else b""
+                recorded = responses.get((self.command, self.path, _body_digest(body)))
+                status, content_type, body = (recorded.status, recorded.content_type, recorded.body) if recorded \
+                    else (404, "text/plain", b"No recorded response")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = do_HEAD = _reply
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="api-stub-server", daemon=True)
+        self._thread.start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def add(self, recorded: RecordedRequest) -> RecordedRequest:
+        """Serve the recorded response and return the request pointing to the stub."""
+        parts = urlsplit(recorded.api_endpoint)
+        path = urlunsplit(("", "", parts.path or "/", parts.query, ""))
+        stub_request = recorded._replace(api_endpoint=self.url + path)
+        # the body the load run sends for the payload
+        body = requests.Request(recorded.method, stub_request.api_endpoint, json=recorded.payload).prepare().body
+        self._responses[(recorded.method, path, _body_digest(body))] = recorded
+        return stub_request
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _histogram(sorted_latencies_ms: List[float]) -> Dict[str, int]:
+    histogram, index = {}, 0
+    for bound in HISTOGRAM_BUCKETS_MS:
+        count = 0
+        while index < len(sorted_latencies_ms) and sorted_latencies_ms[index] <= bound:
+            count += 1
+            index += 1
+        histogram[f"<= {bound} ms"] = count
+    histogram[f"> {HISTOGRAM_BUCKETS_MS[-1]} ms"] = len(sorted_latencies_ms) - index
+    return histogram
+
+
+def run_load(
+    recorded_requests: List[RecordedRequest],
+    users: int,
+    iterations: int = 10,
+    duration: Optional[float] = None,
+    use_stub: bool = True,
+) -> Dict:
+    """Replays the recorded requests, in order, with `users` concurrent virtual users. Each user runs the
+    sequence `iterations` times, or repeatedly for `duration` seconds when it is given.
+    A response with another status code than the recorded one counts as an error."""
+    stub = StubServer() if use_stub else None
+    sequence = [stub.add(recorded) for recorded in recorded_requests] if stub else list(recorded_requests)
+    session = create_session(pool_size=users, max_retries=0)
+    samples = []  # (method, api_endpoint, latency in seconds, is error)
+    lock = threading.Lock()
+
+    def _user():
+        user_samples = []
+        deadline = time.monotonic() + duration if duration else None
+        iteration = 0
+        while (deadline is None and iteration < iterations) or (deadline is not None and time.monotonic() < deadline):
+            iteration += 1
+            for recorded in sequence:
+                started = time.perf_counter()
+                try:
+                    response = session.request(recorded.method, recorded.api_endpoint, headers=recorded.headers,
+                                               json=recorded.payload, timeout=REQUEST_TIMEOUT)
+                    is_error = response.status_code != recorded.status
+                except Exception:
+                    is_error = True
+                user_samples.append((recorded.method, recorded.api_endpoint, time.perf_counter() - started, is_error))
+        with lock:
+            samples.extend(user_samples)
+
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=users, thread_name_prefix="virtual-user") as executor:
+            for future in [executor.submit(_user) for _ in range(users)]:
+                future.result()
+    finally:
+        elapsed = time.perf_counter() - started
+        session.close()
+        if stub:
+            stub.stop()
+
+    summary = _summarize(samples, elapsed)
+    summary.update(users=users, iterations=None if duration else iterations, duration=duration,
+                   target="stub" if use_stub else "live")
+    logger.info(f"API load run: {summary['requests']} requests, {summary['throughput']} req/s, "
+                f"p50 {summary['p50_ms']} ms, p95 {summary['p95_ms']} ms, p99 {summary['p99_ms']} ms, "
+                f"error rate {summary['error_rate']}%")
+    return summary
+
+
+def _summarize(samples: List[tuple], elapsed: float) -> Dict:
+    latencies = sorted(sample[2] * 1000 for sample in samples)
+    errors = sum(1 for sample in samples if sample[3])
+    endpoints = {}
+    for method, api_endpoint, latency, is_error in samples:
+        endpoints.setdefault(f"{method} {urlsplit(api_endpoint).path}", []).append((latency * 1000, is_error))
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": round(100 * errors / len(samples), 2) if samples else 0.0,
+        "elapsed": round(elapsed, 3),
+        "throughput": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "max_ms": round(latencies[-1], 2) if latencies else 0.0,
+        "histogram": _histogram(latencies),
+        "endpoints": {endpoint: _endpoint_summary(values) for endpoint, values in endpoints.items()},
+    }
+
+
+def _endpoint_summary(values: List[tuple]) -> Dict:
+    latencies = sorted(value[0] for value in values)
+    return {
+        "requests": len(values),
+        "errors": sum(1 for value in values if value[1]),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+    }
+
+
+def summary_html(summary: Dict) -> str:
+    """Load results as an HTML table for the HTML report."""
+    if "error" in summary:
+        return (f"<div><strong>API load ({summary['users']} users, {summary['target']})</strong>: "
+                f"failed, {escape(summary['error'])}</div>")
+    rows = "".join(
+        f"<tr><td>{escape(endpoint)}</td><td>{values['requests']}</td><td>{values['errors']}</td>"
+        f"<td>{values['p50_ms']}</td><td>{values['p95_ms']}</td><td>{values['p99_ms']}</td></tr>"
+        for endpoint, values in summary["endpoints"].items()
+    )
+    histogram = ", ".join(f"{bucket}: {count}" for bucket, count in summary["histogram"].items() if count)
+    return (
+        f"<div><strong>API load ({summary['users']} users, {summary['target']})</strong>: "
+        f"{summary['requests']} requests in {summary['elapsed']} s, {summary['throughput']} req/s, "
+        f"error rate {summary['error_rate']}%<br/>Latency histogram: {escape(histogram)}"
+        "<table><tr><th>Endpoint</th><th>Requests</th><th>Errors</th><th>p50 (ms)</th><th>p95 (ms)</th>"
+        f"<th>p99 (ms)</th></tr>{rows}"
+        f"<tr><td><strong>All</strong></td><td>{summary['requests']}</td><td>{summary['errors']}</td>"
+        f"<td>{summary['p50_ms']}</td><td>{summary['p95_ms']}</td><td>{summary['p99_ms']}</td></tr></table></div>"
+    )
+
+
+def summary_json(summary: Dict) -> str:
+    return json.dumps(summary, indent=2)
@@ -1,13 +1,131 @@
 import json
+import logging
+import os
+import threading
+import time
+from collections import deque, namedtuple
 from pathlib import Path
-from typing import Dict
+from typing import Deque, Dict, Iterable, List
+from urllib.parse import urlsplit
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
 
 from main.api.utils.custom_exceptions import InvalidFileFormatException, FileNotFoundException
 from main.api.utils.logger_config import logger
 
-session = requests.Session()
+# Connection pool & retry policy, configurable through the environment (e.g. .local.env).
+# Retries are opt-in: the tests asserting on error responses must receive them as they are sent.
+POOL_SIZE = int(os.environ.get("API_POOL_SIZE", 20))
+MAX_RETRIES = int(os.environ.get("API_MAX_RETRIES", 0))
+BACKOFF_FACTOR = float(os.environ.get("API_BACKOFF_FACTOR", 0.3))
+RETRY_STATUS_CODES = (429, 502, 503, 504)
+REQUEST_TIMEOUT = float(os.environ.get("API_REQUEST_TIMEOUT", 30))
+# longer response bodies are truncated in the debug log
+MAX_LOGGED_BODY = 2000
+
+
+# connect: DNS resolution + TCP connection, tls: TLS handshake, ttfb: until the response headers are received
+# (connect & tls are 0 when a kept-alive connection is reused). All durations are in milliseconds.
+RequestTiming = namedtuple("RequestTiming", "method endpoint status_code connect_ms tls_ms ttfb_ms total_ms")
+
+_request_timings: Deque[RequestTiming] = deque(maxlen=10000)
+# filled by the connections opened while sending the current request of the thread
+_connection_timing = threading.local()
+
+
+class _TimedConnectionMixin:
+    def _new_conn(self):
+        started = time.perf_counter()
+        try:
+            return super()._new_conn()
+        finally:
+            _connection_timing.connect = time.perf_counter() - started
+
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        _connection_timing.established = time.perf_counter() - started
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose connections record how long connecting took."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _TimedHTTPConnectionPool,
+                                                   "https": _TimedHTTPSConnectionPool}
+
+
+def pop_request_timings() -> List[RequestTiming]:
+    """Returns the timings of the requests made since the last call and starts a new recording."""
+    timings = list(_request_timings)
+    _request_timings.clear()
+    return timings
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of already sorted values."""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(q / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def create_session(
+    pool_size: int = POOL_SIZE,
+    max_retries: int = MAX_RETRIES,
+    backoff_factor: float = BACKOFF_FACTOR,
+    status_forcelist: Iterable[int] = RETRY_STATUS_CODES,
+) -> requests.Session:
+    """Create a keep-alive session with a connection pool of pool_size connections per host.
+    With max_retries, connection errors and the status_forcelist responses of idempotent requests are
+    retried with an exponential backoff."""
+    retry = Retry(
+        total=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=tuple(status_forcelist),
+        raise_on_status=False,
+    )
+    adapter = TimedHTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    new_session = requests.Session()
+    new_session.mount("http://", adapter)
+    new_session.mount("https://", adapter)
+    return new_session
+
+
+session = create_session()
+
+# called with (method, api_endpoint, headers, payload, response) after every request, e.g. to record them
+_request_listeners = []
+
+
+def add_request_listener(listener) -> None:
+    _request_listeners.append(listener)
+
+
+def remove_request_listener(listener) -> None:
+    if listener in _request_listeners:
+        _request_listeners.remove(listener)
 
 
 def read_file(file_name: str) -> Dict:
@@ -29,11 +147,19 @@ def get_file_path(file_name: str) -> Path:
     return file_path
 
 
-def make_request(
-    method: str, api_endpoint: str, headers: Dict = None, payload: Dict = None
-) -> requests.Response:
-    """Make a request using the given method and log the request & response details."""
-    response = session.request(method, api_endpoint, headers=headers, json=payload)
+def _body_for_log(content_type: str, text) -> str:
+    if not text:
+        return ""
+    if "json" not in content_type and not content_type.startswith("text") and "xml" not in content_type:
+        return f"<{len(text)} bytes of {content_type or 'unknown content type'}>"
+    text = text if isinstance(text, str) else text.decode("utf-8", errors="replace")
+    return text if len(text) <= MAX_LOGGED_BODY else f"{text[:MAX_LOGGED_BODY]}... ({len(text)} characters)"
+
+
+def log_request_details(method: str, api_endpoint: str, headers: Dict, payload: Dict, response) -> None:
+    """Log the request & response details. The message is only built when debug logging is enabled."""
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
     log_details = "\n".join(
         [
             f"Request Method: {method.upper()}",
@@ -42,10 +168,39 @@ def make_request(
             f"Request Payload: {payload}",
             f"Response Status Code: {response.status_code}",
             f"Response Headers: {response.headers}",
-            f"Response Body: {response.json()}",
+            f"Response Body: {_body_for_log(response.headers.get('Content-Type', ''), response.content)}",
         ]
     )
     logger.debug(log_details)
+
+
+def make_request(
+    method: str, api_endpoint: str, headers: Dict = None, payload: Dict = None,
+    request_session: requests.Session = None, timeout: float = REQUEST_TIMEOUT,
+) -> requests.Response:
+    """Make a request using the given method and log the request & response details.
+    The timing of the request is available as `response.timing`.
+    The request is sent with the shared session unless request_session is given."""
+    _connection_timing.connect = _connection_timing.established = 0.0
+    started = time.perf_counter()
+    response = (request_session or session).request(method, api_endpoint, headers=headers, json=payload,
+                                                    timeout=timeout)
+    total = time.perf_counter() - started
+    url = urlsplit(api_endpoint)
+    tls = _connection_timing.established - _connection_timing.connect if url.scheme == "https" else 0.0
+    response.timing = RequestTiming(
+        method.upper(),
+        url.path or "/",
+        response.status_code,
+        round(_connection_timing.connect * 1000, 2),
+        round(max(tls, 0.0) * 1000, 2),
+        round(response.elapsed.total_seconds() * 1000, 2),
+        round(total * 1000, 2),
+    )
+    _request_timings.append(response.timing)
+    log_request_details(method, api_endpoint, headers, payload, response)
+    for listener in _request_listeners:
+        listener(method, api_endpoint, headers, payload, response)
     return response
 
 
@@ -1,7 +1,6 @@
 import re
 import shutil
-import subprocess
-import time
+import sys
 
 import structlog
 import os
@@ -25,7 +24,11 @@ from _pytest.config import argparsing as pytest_argparsing
 
 from cucumber_tag_expressions import parse
 
+from main.utils.allure_report import generate_allure_report, start_allure_report
+from main.utils.context_store import context_store, write_local_env
 from main.utils.dataset_handler import DatasetHandler
+from main.utils.durations import (load_durations, order_longest_first, parse_shard, record_duration, save_durations,
+                                  split_into_shards)
 # do not remove this unused import. this sets up pytest short summary.
 
 from selenium.common.exceptions import WebDriverException
@@ -34,8 +37,9 @@ from selenium.common.exceptions import WebDriverException
 from main.utils import log_handler
 from main.utils.env_variables import EnvVariables, load_env_from_local_dotenv_file
 from main.utils.pro_storage import BPStorage
-from main.utils.utils import initialize_output_dirs, remove_chars_from_string, zip_screenshots_files, \
-    save_base64_as_png, TEMP_SCREENSHOTS
+from main.utils.screenshot_store import ScreenshotStore
+from main.utils.stream_report import StreamingHtmlReport
+from main.utils.utils import initialize_output_dirs, remove_chars_from_string, TEMP_SCREENSHOTS
 
 logger = structlog.get_logger(__name__)
 PROJECT_DIR = Path.cwd().resolve()
@@ -44,6 +48,11 @@ ALLURE_RESULTS_DIR = Path(os.path.join(PROJECT_DIR, "output_data", "allure", "re
 ALLURE_REPORT_DIR = Path(os.path.join(PROJECT_DIR, "output_data", "allure", "reports"))
 
 bp_storage = BPStorage()
+stream_report = None
+# {"METHOD /path": [total response time in ms]} of every API request of the session
+api_response_times = defaultdict(list)
+# {key: value} saved to the .local.env file at the end of the session, by every worker
+local_env_updates = {}
 NOW = datetime.now().strftime("%d-%m-%Y %H-%M-%S")
 NOT_ALLOWED_CHARACTERS = ["/", "\\", '"', ":", "<", ">", "|", "*", "?", "#", "%", "{", "}", "$", "!", "'", "@", "=",
                           "+", "-"]
@@ -58,14 +67,16 @@ def pytest_configure(config: pytest_config.Config) -> None:
     if is_driver and not os.environ.get('PROJECT_INSTALLATION'):
         config.pluginmanager.import_plugin("main.ui.ui_plugin")
 
-    # reset values & delete files when using BPStorage
+    # reset values when using BPStorage, the shared values are only reset by the controller
     bp_storage.set_api_testing(False)
-    if os.path.exists("html_env_vars.pickle"):
-        os.remove("html_env_vars.pickle")
+    if not hasattr(config, "workerinput"):
+        bp_storage.clear_env_vars_for_html()
 
     load_env_from_local_dotenv_file()
+    context_store.default_scope = config.getoption("variables_scope")
 
-    if Path(f"{os.getcwd()}/{TEMP_SCREENSHOTS}").exists():
+    # the screenshot store is shared by the xdist workers, only the controller starts it from scratch
+    if not hasattr(config, "workerinput") and Path(f"{os.getcwd()}/{TEMP_SCREENSHOTS}").exists():
         try:
             shutil.rmtree(Path(f"{os.getcwd()}/{TEMP_SCREENSHOTS}"))
         finally:
@@ -130,11 +141,170 @@ def pytest_addoption(parser: pytest_argparsing.Parser) -> None:
         metavar="str",
         help="Append a suffix to the HTML report name"
     )
+    parser.addoption(
+        "--step-screenshots",
+        action="store",
+        default="always",
+        choices=("always", "on-failure", "every-n"),
+        help="When to attach a screenshot to the Allure report after a step: always, on-failure or every-n",
+    )
+    parser.addoption(
+        "--step-screenshots-interval",
+        action="store",
+        default=1,
+        type=int,
+        help="Attach a step screenshot every N steps when using '--step-screenshots every-n'",
+    )
+    parser.addoption(
+        "--step-screenshots-scale",
+        action="store",
+        default=1.0,
+        type=float,
+        help="Downsample factor (0-1] applied to the step screenshots before they are attached",
+    )
+    parser.addoption(
+        "--screenshot-workers",
+        action="store",
+        default=2,
+        type=int,
+        help="Number of background workers writing the step screenshots",
+    )
+    parser.addoption(
+        "--screenshot-queue-size",
+        action="store",
+        default=16,
+        type=int,
+        help="Maximum number of step screenshots waiting to be written before a step blocks",
+    )
+    parser.addoption(
+        "--in-browser-waits",
+        action="store_true",
+        default=False,
+        help="On Chromium, wait for elements inside the browser with a MutationObserver instead of polling",
+    )
+    parser.addoption(
+        "--reuse-sessions",
+        action="store_true",
+        default=False,
+        help="Reuse the desktop Chrome & Edge sessions between scenarios, resetting cookies, storage, windows and URL",
+    )
+    parser.addoption(
+        "--session-max-reuse",
+        action="store",
+        type=int,
+        default=20,
+        help="Number of scenarios a browser session runs before a new one is created (with --reuse-sessions)",
+    )
+    parser.addoption(
+        "--api-load-users",
+        action="store",
+        type=int,
+        default=0,
+        help="API load mode: replay the requests of every passed scenario with this number of concurrent users",
+    )
+    parser.addoption(
+        "--api-load-iterations",
+        action="store",
+        type=int,
+        default=10,
+        help="API load mode: number of times each user replays the scenario requests",
+    )
+    parser.addoption(
+        "--api-load-duration",
+        action="store",
+        type=float,
+        default=None,
+        help="API load mode: replay the scenario requests for this number of seconds instead of a number of iterations",
+    )
+    parser.addoption(
+        "--api-load-target",
+        action="store",
+        default="stub",
+        choices=("stub", "live"),
+        help="API load mode: replay against a local stub serving the recorded responses (stub) or the real API (live)",
+    )
+    parser.addoption(
+        "--api-cassettes",
+        action="store",
+        default="off",
+        choices=("off", "replay", "record", "offline"),
+        help="Replay the API responses recorded in test_data/api/cassettes and record the missing ones (replay), "
+             "record all of them again (record) or replay them without any network access (offline)",
+    )
+    parser.addoption(
+        "--variables-scope",
+        action="store",
+        default="scenario",
+        choices=("scenario", "session"),
+        help="Keep the variables saved by the steps until the end of the scenario (scenario) or of the session (session)",
+    )
+    parser.addoption(
+        "--allure-report",
+        action="store",
+        default="wait",
+        choices=("wait", "detached", "off"),
+        help="Generate the Allure report before pytest exits (wait), in a background process after the run (detached) "
+             "or not at all (off)",
+    )
+    parser.addoption(
+        "--stream-html",
+        action="store",
+        default=None,
+        help="Write an HTML report row by row while the tests run, with the screenshots as lazily loaded assets",
+    )
+    parser.addoption(
+        "--order-by-duration",
+        action="store_true",
+        default=False,
+        help="Run the longest tests first, based on the durations of the previous runs",
+    )
+    parser.addoption(
+        "--shard",
+        action="store",
+        default=None,
+        help="Run only the i-th of N shards balanced by the durations of the previous runs, e.g. --shard=1/4",
+    )
+    parser.addoption(
+        "--grid-scheduling",
+        action="store_true",
+        default=False,
+        help="With pytest-xdist, only run as many tests at once as the Selenium Grid has free slots for the browser",
+    )
+    parser.addoption(
+        "--grid-status-url",
+        action="store",
+        default=None,
+        help="Grid status endpoint for --grid-scheduling (default: http://<selenium-host>:<selenium-port>/status)",
+    )
+    parser.addoption(
+        "--grid-slots",
+        action="store",
+        type=int,
+        default=0,
+        help="Number of sessions available for --grid-scheduling when there is no grid status endpoint",
+    )
+    parser.addoption(
+        "--visual-batch",
+        action="store_true",
+        default=False,
+        help="At the end of the session compare every base/test image pair of test_data/visualtesting in parallel",
+    )
+    parser.addoption(
+        "--visual-batch-approve",
+        action="store_true",
+        default=False,
+        help="With --visual-batch, replace the base image of every failed comparison with its test image",
+    )
 
 
 def pytest_sessionstart(session: pytest.Session) -> None:
+    global stream_report
     initialize_output_dirs()
 
+    if session.config.getoption("stream_html") and not hasattr(session.config, "workerinput"):
+        stream_report = StreamingHtmlReport(session.config.getoption("stream_html"))
+        stream_report.open()
+
     html_metadata = session.config._metadata
     while html_metadata.get("Server") is not None:
         html_metadata.pop("Server")
@@ -152,18 +322,18 @@ def pytest_sessionstart(session: pytest.Session) -> None:
 @pytest.hookimpl(tryfirst=True)
 def pytest_sessionfinish(session, exitstatus) -> None:
 
-    if exitstatus == 0 or exitstatus == 1 or exitstatus == 6:
-        command_generate_allure_report = [
-            'allure generate ' + ALLURE_RESULTS_DIR.__str__() + ' -o ' + ALLURE_REPORT_DIR.__str__() + ' --clean']
-        result = subprocess.Popen(command_generate_allure_report, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                                  shell=True)
-        print(f"Allure Process ID : {result.pid}")
-        print('Allure Report is being generated...')
-        stdout, stderr = result.communicate()
-        print('Allure Report has been generated successfully...')
-        time.sleep(5)
-    else:
-        print(f"Report not generated because of no tag found")
+    # the report is generated once, by the controller
+    allure_report = session.config.getoption("allure_report")
+    if not hasattr(session.config, "workerinput") and allure_report != "off":
+        if exitstatus == 0 or exitstatus == 1 or exitstatus == 6:
+            if allure_report == "wait":
+                generate_allure_report(ALLURE_RESULTS_DIR, ALLURE_REPORT_DIR)
+            else:
+                process = start_allure_report(ALLURE_RESULTS_DIR, ALLURE_REPORT_DIR)
+                print(f"Allure Report is being generated in the background (process ID : {process.pid}) "
+                      f"into {ALLURE_REPORT_DIR}")
+        else:
+            print(f"Report not generated because of no tag found")
 
     base_url_meta_key = "Base URL"
     chars_to_remove = ['{', '}', '"']
@@ -218,6 +388,89 @@ def pytest_sessionfinish(session, exitstatus) -> None:
 
     session.config._metadata = ordered_metadata
 
+    if not hasattr(session.config, "workerinput"):
+        save_durations()
+        write_local_env(local_env_updates)
+        if stream_report is not None:
+            stream_report.close()
+
+    if session.config.getoption("visual_batch") and not hasattr(session.config, "workerinput"):
+        from main.ui.common.utils.visual_batch import run_visual_batch
+        summary = run_visual_batch(approve=session.config.getoption("visual_batch_approve"))
+        print(f"Visual batch comparison: {summary['passed']} passed, {summary['failed']} failed, "
+              f"{summary['errors']} errors out of {summary['total']} images")
+
+
+def pytest_bdd_before_scenario(request, feature, scenario) -> None:
+    context_store.begin_scenario()
+    # API cassettes: the requests of the scenario are replayed from / recorded to its cassette
+    if request.config.getoption("api_cassettes") != "off":
+        from main.api.utils.cassettes import cassette_name, eject_cassette, use_cassette
+        use_cassette(cassette_name(request.node.nodeid), request.config.getoption("api_cassettes"))
+        request.addfinalizer(eject_cassette)
+    # API load mode: the requests of the scenario are recorded to be replayed under load afterwards
+    if request.config.getoption("api_load_users"):
+        from main.api.utils.load_mode import RequestRecorder
+        from main.api.utils.utils import add_request_listener, remove_request_listener
+        recorder = RequestRecorder()
+        add_request_listener(recorder)
+        request.addfinalizer(lambda: remove_request_listener(recorder))
+        request.node._api_request_recorder = recorder
+
+
+def pytest_bdd_after_scenario(request, feature, scenario) -> None:
+    context_store.end_scenario()
+    recorder = getattr(request.node, "_api_request_recorder", None)
+    if recorder is not None:
+        from main.api.utils.utils import remove_request_listener
+        remove_request_listener(recorder)
+
+
+def _run_api_load(item: pytest.Item, recorder) -> None:
+    # run once the call report is made, so the load time is not part of the scenario duration,
+    # and a load run which fails is reported in its summary instead of failing the scenario
+    import allure
+    from main.api.utils.load_mode import run_load, summary_json
+    config = item.config
+    users, use_stub = config.getoption("api_load_users"), config.getoption("api_load_target") == "stub"
+    try:
+        summary = run_load(
+            recorder.requests,
+            users=users,
+            iterations=config.getoption("api_load_iterations"),
+            duration=config.getoption("api_load_duration"),
+            use_stub=use_stub,
+        )
+    except Exception as error:
+        logger.warning("API load run failed", test=item.nodeid, error=str(error))
+        summary = {"users": users, "target": "stub" if use_stub else "live", "error": f"{type(error).__name__}: {error}"}
+    item.api_load_summary = summary
+    allure.attach(summary_json(summary), name="API load results", attachment_type=allure.attachment_type.JSON)
+
+
+# on the xdist controller, the reports of every worker are received here
+def pytest_runtest_logreport(report) -> None:
+    record_duration(report)
+    for method, endpoint, *_, total_ms in getattr(report, "api_timings", None) or []:
+        api_response_times[f"{method} {endpoint}"].append(total_ms)
+    local_env_updates.update(getattr(report, "local_env_updates", None) or ())
+    if stream_report is not None:
+        stream_report.add(report)
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_xdist_make_scheduler(config, log):
+    if not config.getoption("grid_scheduling"):
+        return None
+    from main.utils.grid_scheduler import GridCapacity, GridScheduling, grid_status_url
+    capabilities = getattr(config, "_capabilities", {})
+    capacity = GridCapacity(
+        grid_status_url(config),
+        capabilities.get("browserName", config.getoption("driver") or ""),
+        static_slots=config.getoption("grid_slots"),
+    )
+    return GridScheduling(config, log, capacity=capacity)
+
 
 def pytest_collection_modifyitems(
         config: pytest_config.Config, items: List[pytest.Item]
@@ -237,10 +490,37 @@ def pytest_collection_modifyitems(
                 if not parse(raw_tags).evaluate(item_tags):
                     item.add_marker(pytest.mark.not_in_scope)
 
+    if config.getoption("shard") or config.getoption("order_by_duration"):
+        _order_and_shard_items(config, items)
+
     if not bp_storage.is_api_testing() and not os.environ.get('PROJECT_INSTALLATION'):
         config.pluginmanager.import_plugin("main.ui.ui_plugin")
 
 
+def _order_and_shard_items(config: pytest_config.Config, items: List[pytest.Item]) -> None:
+    durations = load_durations()
+    # tests filtered out by the tags are not run, so they do not count in the shard balance
+    in_scope = [item.nodeid for item in items if item.get_closest_marker("not_in_scope") is None]
+
+    if config.getoption("shard"):
+        try:
+            shard_index, shard_count = parse_shard(config.getoption("shard"))
+        except ValueError as error:
+            raise pytest.UsageError(str(error))
+        shard = set(split_into_shards(in_scope, durations, shard_count)[shard_index - 1])
+        deselected = [item for item in items if item.nodeid not in shard]
+        if deselected:
+            config.hook.pytest_deselected(items=deselected)
+            items[:] = [item for item in items if item.nodeid in shard]
+        logger.info("Running shard", shard=f"{shard_index}/{shard_count}", tests=len(items),
+                    expected_duration=round(sum(durations.get(nodeid, 0.0) for nodeid in shard), 1))
+
+    if config.getoption("order_by_duration"):
+        position = {nodeid: index for index, nodeid in enumerate(
+            order_longest_first([item.nodeid for item in items], durations))}
+        items.sort(key=lambda item: position[item.nodeid])
+
+
 @pytest.fixture(scope='session')
 def env_variables(request):
     env_vars_file_path = f"{request.session.config.known_args_namespace.confcutdir}/configs/.local.env"
@@ -274,7 +554,18 @@ def proxy_url(request):
 
 @pytest.fixture(autouse=True)
 def dataset_handler(dataset):
-    return DatasetHandler(dataset)
+    handler = DatasetHandler()
+    handler.set_dataset(dataset)
+    return handler
+
+
+def _screenshot_extra(screenshot_store: ScreenshotStore, digest: str, assets_folder: Path, self_contained: bool):
+    # A self-contained report has to embed the image, otherwise the report only references the stored file
+    if self_contained:
+        return pytest_html.extras.image(screenshot_store.get_base64(digest))
+    screenshot_store.export(digest, assets_folder / f"{digest}.png")
+    return pytest_html.extras.html(
+        f'<div class="image"><a href="assets/{digest}.png"><img src="assets/{digest}.png"/></a></div>')
 
 
 @pytest.hookimpl(tryfirst=True, hookwrapper=True)
@@ -288,6 +579,24 @@ def pytest_runtest_makereport(item, call):
     setattr(rep, "duration_formatter", "%M:%S.%f")
     extra = getattr(rep, "extra", [])
 
+    # timings of the API requests of the test, as plain tuples so that they can be sent by the xdist workers
+    api_utils = sys.modules.get("main.api.utils.utils")
+    if rep.when == "call" and api_utils is not None:
+        rep.api_timings = [tuple(timing) for timing in api_utils.pop_request_timings()]
+
+    # the .local.env file is only written by the controller, at the end of the session
+    updates = context_store.pop_local_env_updates()
+    if updates:
+        rep.local_env_updates = tuple(updates.items())
+
+    recorder = getattr(item, "_api_request_recorder", None)
+    if rep.when == "call" and rep.passed and recorder is not None and recorder.requests:
+        _run_api_load(item, recorder)
+    if rep.when == "call" and getattr(item, "api_load_summary", None):
+        from main.api.utils.load_mode import summary_html
+        extra.append(pytest_html.extras.html(summary_html(item.api_load_summary)))
+        rep.extra = extra
+
     if not bp_storage.is_api_testing():
         # HTML Report: Store the Scenario Outline data
         if rep.when == "teardown":
@@ -338,39 +647,43 @@ def pytest_runtest_makereport(item, call):
                 assets_folder = DEFAULT_ASSETS_DIR
                 if feature_request.config.option.htmlpath:
                     assets_folder = Path(os.path.abspath(feature_request.config.option.htmlpath)).parent / "assets"
-                screenshot_source = None
+                screenshot_store = ScreenshotStore()
+                screenshot_digest = None
                 if (rep.skipped and xfail) or (rep.failed and not xfail):
-                    screenshot_source = driver.get_screenshot_as_base64()
+                    screenshot_digest = screenshot_store.put(driver.get_screenshot_as_png())
                     ss_file = remove_chars_from_string(feature_request.node.name, NOT_ALLOWED_CHARACTERS)
-                    ss_file = f"output_data/screenshots/{ss_file}.png"
-                    driver.save_screenshot(ss_file)
+                    screenshot_store.export(screenshot_digest, f"output_data/screenshots/{ss_file}.png")
                 if (rep.skipped and xfail) or (rep.failed and not xfail) or (rep.passed and not xfail):
                     node_name = feature_request.node.name
                     if (scenario := getattr(rep, "scenario", None)) and (feature := scenario.get('feature', None)):
                         scenario_cache = feature_request.config.cache.get(f"{feature['name']}/{scenario['name']}", {})
                         if node_name not in scenario_cache:
-                            scenario_cache[node_name] = [screenshot_source]
+                            scenario_cache[node_name] = [screenshot_digest]
                         elif scenario_cache.get(node_name, None):
-                            scenario_cache.get(node_name, []).append(screenshot_source)
+                            scenario_cache.get(node_name, []).append(screenshot_digest)
                         scenario_cache[node_name] = [element for element in scenario_cache.get(node_name, []) if
                                                      element is not None]
+                        self_contained = feature_request.config.getoption("self_contained_html", False)
                         if len(scenario_cache.get(node_name, [])) > 2:
                             zipped_file_name = "_".join(["screenshots", node_name, NOW])
                             zipped_file_name = remove_chars_from_string(zipped_file_name, NOT_ALLOWED_CHARACTERS)
-                            for idx, screenshot in enumerate(scenario_cache.get(node_name, [])):
+                            zipped_files = {}
+                            for idx, digest in enumerate(scenario_cache.get(node_name, [])):
                                 file_name = f"{feature['name']}_{scenario['name']}_{str(idx)}.png"
                                 file_name = remove_chars_from_string(file_name, NOT_ALLOWED_CHARACTERS)
-                                save_base64_as_png(data=screenshot, dest_folder=assets_folder / zipped_file_name,
-                                                   dest_file_name=file_name)
-                            zip_screenshots_files(assets_folder / zipped_file_name, zipped_file_name, assets_folder)
+                                zipped_files[file_name] = digest
+                            screenshot_store.zip(zipped_files, assets_folder / f"{zipped_file_name}.zip")
                             extra.append(
                                 pytest_html.extras.url('assets/' + f'{zipped_file_name}' + '.zip', "Screenshots zip"))
-                            if screenshot_source:
-                                extra.append(pytest_html.extras.image(screenshot_source))
+                            if screenshot_digest:
+                                extra.append(_screenshot_extra(screenshot_store, screenshot_digest, assets_folder,
+                                                               self_contained))
                         else:
                             extra.extend(
-                                [pytest_html.extras.image(screenshot) for screenshot in
-                                 reversed(scenario_cache.get(node_name, []))])
+                                [_screenshot_extra(screenshot_store, digest, assets_folder, self_contained)
+                                 for digest in reversed(scenario_cache.get(node_name, []))])
+                        # the streaming report exports the screenshots itself, it only needs their digests
+                        rep.screenshot_digests = list(reversed(scenario_cache.get(node_name, [])))
                 if public_link:
                     extra.append(pytest_html.extras.url(public_link, "BrowserStack View"))
                     rep.test_metadata = f"Browserstack Public Link, {public_link}"
@@ -403,12 +716,8 @@ def pytest_html_results_table_row(report, cells):
     # HTML Report: Set downloadable links and Test Name as 'Feature name -> Scenario name' with scenario outline sets
     if cells:
         if not bp_storage.is_api_testing():
-            cells.insert(0, copy.deepcopy(cells[1]))
-            cells.insert(0, copy.deepcopy(cells[0]))
-            cells[0][0] = "Section"
-            cells[1][0] = "Tag"
-            cells[0].attr.class_ = "col-section"
-            cells[1].attr.class_ = "col-tags"
+            cells.insert(0, html.td("Tag", class_="col-tags"))
+            cells.insert(0, html.td("Section", class_="col-section"))
             for cell in cells:
                 attr_ = getattr(cell, "attr", None)
                 if attr_ and len(cell) and cell[0] == "Section":
@@ -467,6 +776,19 @@ def pytest_html_results_table_html(report, data):
                         break
 
 
+def pytest_terminal_summary(terminalreporter) -> None:
+    if not api_response_times:
+        return
+    from main.api.utils.utils import percentile
+    terminalreporter.write_sep("=", "API response times (ms)")
+    terminalreporter.write_line(f"{'Endpoint':<50} {'Calls':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'Max':>9}")
+    for endpoint, times in sorted(api_response_times.items()):
+        times = sorted(times)
+        terminalreporter.write_line(
+            f"{endpoint[:50]:<50} {len(times):>6} {percentile(times, 50):>9.1f} {percentile(times, 95):>9.1f} "
+            f"{percentile(times, 99):>9.1f} {times[-1]:>9.1f}")
+
+
 def pytest_html_report_title(report, title="Test Results"):
     if os.getenv("CI") == "true":
         title = title + " - " + os.getenv('GITHUB_WORKFLOW', "")
@@ -1,5 +1,9 @@
 import base64
+import pkgutil
+import time
 import typing
+from collections import namedtuple
+from functools import lru_cache
 from io import BytesIO
 
 import cv2
@@ -157,15 +161,103 @@ class _Find:
         return self.find_elements(locator)
 
 
+ElementState = namedtuple("ElementState", "element present visible in_viewport rect")
+
+
+@lru_cache(maxsize=None)
+def _with_displayed_atom(script: str) -> str:
+    """Inserts the isDisplayed atom used by WebElement.is_displayed() in the script."""
+    is_displayed = pkgutil.get_data("selenium.webdriver.remote", "isDisplayed.js").decode("utf8")
+    return script.format(is_displayed=is_displayed)
+
+
 class _Verification(_Find):
+    # the visibility is computed with the same atom as WebElement.is_displayed(), so it also accounts for the
+    # opacity, the visibility of the ancestors and the overflow clipping
+    _ELEMENT_STATE_SCRIPT = (
+        "const [type, identifier, given] = arguments; \n"
+        "const isDisplayed = {is_displayed}; \n"
+        "const finders = {{ \n"
+        "    XP: () => document.evaluate(identifier, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null) \n"
+        "        .singleNodeValue, \n"
+        "    CS: () => document.querySelector(identifier), \n"
+        "    ID: () => document.getElementById(identifier), \n"
+        "    NM: () => document.getElementsByName(identifier)[0], \n"
+        "    CN: () => document.getElementsByClassName(identifier)[0], \n"
+        "    TN: () => document.getElementsByTagName(identifier)[0], \n"
+        "}}; \n"
+        "const el = given || (finders[type] ? finders[type]() : null); \n"
+        "if (!el) {{ return {{element: null, present: false}}; }} \n"
+        "const rect = el.getBoundingClientRect(); \n"
+        "const windowHeight = (window.innerHeight || document.documentElement.clientHeight); \n"
+        "const windowWidth = (window.innerWidth || document.documentElement.clientWidth); \n"
+        "return {{ \n"
+        "    element: el, \n"
+        "    present: true, \n"
+        "    visible: isDisplayed(el), \n"
+        "    inViewport: (rect.top <= windowHeight) && ((rect.top + rect.height) > 0) \n"
+        "        && (rect.left <= windowWidth) && ((rect.left + rect.width) > 0), \n"
+        "    rect: {{x: rect.x, y: rect.y, width: rect.width, height: rect.height}}, \n"
+        "}};"
+    )
+
     def __init__(self, driver: WebDriver):
         self.driver = driver
         super().__init__(self.driver)
 
+    def _element_state_args(self, locator: typing.Union[Locator, ShadowLocator, WebElement, str]):
+        if getattr(self, "_device", "desktop") != "desktop":
+            return None
+        _locator = parse_locator(locator) if isinstance(locator, str) else locator
+        if isinstance(_locator, WebElement):
+            return None, None, _locator
+        if isinstance(_locator, Locator):
+            if _locator.type in (ValidLocatorTypes.LT, ValidLocatorTypes.PL):
+                # link texts are matched by WebDriver on the rendered text, not on the textContent
+                elements = self.find_elements(_locator)
+                return None, None, elements[0] if elements else None
+            return _locator.type.name, _locator.identifier, None
+        return None
+
+    def get_element_state(
+        self, locator: typing.Union[Locator, ShadowLocator, WebElement, str]
+    ) -> typing.Optional[ElementState]:
+        """Resolves the element and reads its presence, visibility (as WebElement.is_displayed()) & in viewport
+        state and its bounding rect in a single script execution. Returns None when the locator cannot be probed
+        with JavaScript (shadow locators, native mobile contexts), so callers fall back to WebDriver commands."""
+        args = self._element_state_args(locator)
+        if args is None:
+            return None
+        try:
+            state = self.execute_sync_js(_with_displayed_atom(self._ELEMENT_STATE_SCRIPT), *args)
+        except selenium_exceptions.StaleElementReferenceException:
+            return ElementState(None, False, False, False, None)
+        except selenium_exceptions.JavascriptException:
+            return None
+        if not state or not state.get("present"):
+            return ElementState(None, False, False, False, None)
+        return ElementState(state["element"], True, state["visible"], state["inViewport"], state["rect"])
+
+    def _is_element_actionable(
+        self, locator: typing.Union[Locator, ShadowLocator, WebElement, str]
+    ) -> typing.Union[WebElement, bool]:
+        state = self.get_element_state(locator)
+        if state is None:
+            element = self._is_element_visible(locator)
+            return element if element and element.is_enabled() else False
+        try:
+            return state.element if state.visible and state.element.is_enabled() else False
+        except selenium_exceptions.StaleElementReferenceException:
+            return False
+
     def _is_in_viewport(
         self, locator: typing.Union[Locator, ShadowLocator, WebElement, str]
     ):
         logger.info("Verifying if element is in view port", element=locator)
+        state = self.get_element_state(locator)
+        if state is not None:
+            logger.info("Is element present in view port: ", element=locator, is_in_view=state.in_viewport)
+            return state.in_viewport
         script = (
             "if (!arguments[0].getBoundingClientRect) { \n"
             "    return false \n"
@@ -241,6 +333,10 @@ class _Verification(_Find):
         locator: typing.Union[Locator, ShadowLocator, WebElement, str],
     ) -> typing.Union[WebElement, bool]:
 
+        state = self.get_element_state(locator)
+        if state is not None:
+            return state.element if state.visible else False
+
         _locator = None
         if isinstance(locator, str):
             _locator = parse_locator(locator)
@@ -260,13 +356,72 @@ class _Verification(_Find):
             except (selenium_exceptions.NoSuchElementException, selenium_exceptions.StaleElementReferenceException):
                 return False
 
+    # milliseconds between two checks of the in-browser wait, besides the checks on DOM mutations
+    _VISIBLE_IN_BROWSER_POLL_INTERVAL = 250
+    _VISIBLE_IN_BROWSER_SCRIPT = (
+        "const [type, identifier, timeout, pollInterval] = arguments; \n"
+        "const done = arguments[arguments.length - 1]; \n"
+        "const find = () => type === 'XP' \n"
+        "    ? document.evaluate(identifier, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue \n"
+        "    : document.querySelector(identifier); \n"
+        "const isDisplayed = {is_displayed}; \n"
+        "const isVisible = () => {{ \n"
+        "    const el = find(); \n"
+        "    return !!el && isDisplayed(el); \n"
+        "}}; \n"
+        "if (isVisible()) {{ return done(true); }} \n"
+        "let finished = false; \n"
+        "const finish = (result) => {{ \n"
+        "    if (finished) {{ return; }} \n"
+        "    finished = true; \n"
+        "    observer.disconnect(); clearInterval(poller); clearTimeout(timer); \n"
+        "    done(result); \n"
+        "}}; \n"
+        "const check = () => {{ if (isVisible()) {{ finish(true); }} }}; \n"
+        "const observer = new MutationObserver(check); \n"
+        "const poller = setInterval(check, pollInterval); \n"
+        "const timer = setTimeout(() => finish(isVisible()), timeout); \n"
+        "observer.observe(document, {{childList: true, subtree: true, attributes: true, characterData: true}});"
+    )
+
+    def _wait_visible_in_browser(
+        self, locator: Locator, wait_for: int
+    ) -> typing.Union[WebElement, bool, None]:
+        # Resolves inside the browser as soon as a DOM mutation makes the element visible. The element is also
+        # checked periodically, for the changes that are not DOM mutations (CSS transitions & animations, layout).
+        # Returns None when the wait cannot run in the browser, so the caller falls back to polling.
+        start_time = time.monotonic()
+        script_timeout = self.driver.timeouts.script
+        try:
+            self.driver.set_script_timeout(wait_for + 5)
+            is_visible = self.driver.execute_async_script(
+                _with_displayed_atom(self._VISIBLE_IN_BROWSER_SCRIPT), locator.type.name, locator.identifier,
+                int(wait_for * 1000), self._VISIBLE_IN_BROWSER_POLL_INTERVAL
+            )
+            element = self._is_element_visible(locator) if is_visible else False
+        except selenium_exceptions.WebDriverException as error:
+            logger.debug("In-browser wait not available, falling back to polling", error=str(error))
+            return None
+        finally:
+            self.driver.set_script_timeout(script_timeout)
+        wait.record_wait("_wait_visible_in_browser", locator, time.monotonic() - start_time, 1, bool(element))
+        return element
+
     def is_element_visible(
         self,
         locator: typing.Union[Locator, ShadowLocator, WebElement, str],
         wait_for: int = 60,
     ) -> typing.Union[WebElement, bool]:
+        deadline = time.monotonic() + wait_for
+        if getattr(self, "in_browser_waits", False):
+            _locator = parse_locator(locator) if isinstance(locator, str) else locator
+            if isinstance(_locator, Locator) and _locator.type in (ValidLocatorTypes.XP, ValidLocatorTypes.CS):
+                element = self._wait_visible_in_browser(_locator, wait_for)
+                if element is not None:
+                    return element
+        # when the in-browser wait failed part way, polling only gets the rest of wait_for (one check at least)
         return wait.wait_until(
-            self._is_element_visible, locator, max_wait_time=wait_for
+            self._is_element_visible, locator, max_wait_time=max(deadline - time.monotonic(), 0)
         )
 
     def is_element_clickable(
@@ -354,9 +509,10 @@ class _Action(_Verification):
     def click_by_action(
         self, locator: typing.Union[Locator, ShadowLocator, WebElement, str], *, max_wait_time: int = 20
     ):
-        assert self.is_element_visible(locator, max_wait_time)
+        element = self.is_element_visible(locator, max_wait_time)
+        assert element
         actions = ActionChains(self.driver)
-        actions.click(self.get_element(locator)).perform()
+        actions.click(element).perform()
 
     def click_and_hold(
         self, locator: typing.Union[Locator, ShadowLocator, WebElement, str]
@@ -428,16 +584,15 @@ class _Information(_Verification):
         self, locator: typing.Union[Locator, ShadowLocator, WebElement, str]
     ) -> str:
         # prerequisite - element should be visible
-        assert self.is_element_visible(
-            locator
-        ), f"Locator {locator} is not visible on screen to get text."
+        element = self.is_element_visible(locator)
+        assert element, f"Locator {locator} is not visible on screen to get text."
 
         _locator = None
         if isinstance(locator, str):
             _locator = parse_locator(locator)
 
         if not isinstance(_locator, ShadowLocator) or self.driver.capabilities.get("platformName", "") != "iOS":
-            return self.get_element(locator).text
+            return element.text if isinstance(element, WebElement) else self.get_element(locator).text
         else:
             return self.perform_action_on_shadow_element_non_chromium(_locator, "textContent")
 
@@ -502,16 +657,15 @@ class _Interaction(_Verification):
         *,
         max_wait_time: int = 20,
     ):
-        assert self.is_element_visible(
-            locator, max_wait_time
-        ), f"{locator} is not visible for entering text.."
+        element = self.is_element_visible(locator, max_wait_time)
+        assert element, f"{locator} is not visible for entering text.."
 
         _locator = None
         if isinstance(locator, str):
             _locator = parse_locator(locator)
 
         try:
-            self.get_element(locator).send_keys(text_to_enter)
+            element.send_keys(text_to_enter)
         except Exception:
             if isinstance(_locator, ShadowLocator) and self.driver.capabilities.get("platformName", "") == "iOS":
                 self.perform_action_on_shadow_element_non_chromium(_locator, f"textContent={text_to_enter}")
@@ -528,16 +682,15 @@ class _Interaction(_Verification):
         *,
         max_wait_time: int = 20,
     ):
-        assert self.is_element_visible(
-            locator, max_wait_time
-        ), f"{locator} is not visible for clearing text.."
+        element = self.is_element_visible(locator, max_wait_time)
+        assert element, f"{locator} is not visible for clearing text.."
 
         _locator = None
         if isinstance(locator, str):
             _locator = parse_locator(locator)
 
         try:
-            self.get_element(locator).clear()
+            element.clear()
         except Exception:
             if isinstance(_locator, ShadowLocator) and self.driver.capabilities.get("platformName", "") == "iOS":
                 self.perform_action_on_shadow_element_non_chromium(_locator, f'textContent=""')
@@ -556,10 +709,15 @@ class _Interaction(_Verification):
         if isinstance(locator, str):
             _locator = parse_locator(locator)
 
-        assert (self.is_element_visible(locator) and self.is_enabled(locator, max_wait_time)), \
-                f"{locator} is either not visible or enabled for the click operation to succeed.."
+        if self._element_state_args(locator) is not None:
+            element = wait.wait_until(self._is_element_actionable, locator, max_wait_time=max(max_wait_time, 60))
+            assert element, f"{locator} is either not visible or enabled for the click operation to succeed.."
+        else:
+            assert (self.is_element_visible(locator) and self.is_enabled(locator, max_wait_time)), \
+                    f"{locator} is either not visible or enabled for the click operation to succeed.."
+            element = None
         try:
-            self.get_element(locator).click()
+            (element or self.get_element(locator)).click()
         except Exception:
             if self.driver.capabilities.get("platformName", "") == "iOS" and isinstance(_locator, ShadowLocator):
                 if wait_until(self.get_element, locator, max_wait_time=max_wait_time):
@@ -608,10 +766,9 @@ class _Select(_Verification):
         select_locator: typing.Union[Locator, ShadowLocator, WebElement, str],
         ind: int,
     ):
-        assert self.is_element_visible(
-            select_locator
-        ), f"Locator {select_locator} is not visible on screen ..."
-        select_object = Select(self.get_element(select_locator))
+        element = self.is_element_visible(select_locator)
+        assert element, f"Locator {select_locator} is not visible on screen ..."
+        select_object = Select(element)
         select_object.select_by_index(ind)
 
     def select_by_value(
@@ -619,10 +776,9 @@ class _Select(_Verification):
         select_locator: typing.Union[Locator, ShadowLocator, WebElement, str],
         value: str,
     ):
-        assert self.is_element_visible(
-            select_locator
-        ), f"Locator {select_locator} is not visible on screen ..."
-        select_object = Select(self.get_element(select_locator))
+        element = self.is_element_visible(select_locator)
+        assert element, f"Locator {select_locator} is not visible on screen ..."
+        select_object = Select(element)
         select_object.select_by_value(value)
 
     def select_by_visible_text(
@@ -630,10 +786,9 @@ class _Select(_Verification):
         select_locator: typing.Union[Locator, ShadowLocator, WebElement, str],
         text: str,
     ):
-        assert self.is_element_visible(
-            select_locator
-        ), f"Locator {select_locator} is not visible on screen ..."
-        select_object = Select(self.get_element(select_locator))
+        element = self.is_element_visible(select_locator)
+        assert element, f"Locator {select_locator} is not visible on screen ..."
+        select_object = Select(element)
         select_object.select_by_visible_text(text)
 
     def deselect_by_index(
@@ -641,10 +796,9 @@ class _Select(_Verification):
         select_locator: typing.Union[Locator, ShadowLocator, WebElement, str],
         ind: int,
     ):
-        assert self.is_element_visible(
-            select_locator
-        ), f"Locator {select_locator} is not visible on screen ..."
-        select_object = Select(self.get_element(select_locator))
+        element = self.is_element_visible(select_locator)
+        assert element, f"Locator {select_locator} is not visible on screen ..."
+        select_object = Select(element)
         select_object.deselect_by_index(ind)
 
     def deselect_by_value(
@@ -652,10 +806,9 @@ class _Select(_Verification):
         select_locator: typing.Union[Locator, ShadowLocator, WebElement, str],
         value: str,
     ):
-        assert self.is_element_visible(
-            select_locator
-        ), f"Locator {select_locator} is not visible on screen ..."
-        select_object = Select(self.get_element(select_locator))
+        element = self.is_element_visible(select_locator)
+        assert element, f"Locator {select_locator} is not visible on screen ..."
+        select_object = Select(element)
         select_object.deselect_by_value(value)
 
     def deselect_by_visible_text(
@@ -663,10 +816,9 @@ class _Select(_Verification):
         select_locator: typing.Union[Locator, ShadowLocator, WebElement, str],
         text: str,
     ):
-        assert self.is_element_visible(
-            select_locator
-        ), f"Locator {select_locator} is not visible on screen ..."
-        select_object = Select(self.get_element(select_locator))
+        element = self.is_element_visible(select_locator)
+        assert element, f"Locator {select_locator} is not visible on screen ..."
+        select_object = Select(element)
         select_object.deselect_by_visible_text(text)
 
 class _Iframe(_Verification):
@@ -10,6 +10,7 @@ def are_two_webelements_look_same(
     base_image_name_with_ext: str,
     selenium_generics: SeleniumGenerics,
     locator: typing.Union[Locator, ShadowLocator, WebElement, str],
+    **tolerances,
 ) -> bool:
     file_pths = visual_utils.file_paths(base_image_name_with_ext)
     assert (
@@ -23,17 +24,18 @@ def are_two_webelements_look_same(
 
     with open(file_pths.test, "wb") as f:
         f.write(png_screenshot)
-    return visual_utils.are_images_same(base_image_name_with_ext)
+    return visual_utils.are_images_same(base_image_name_with_ext, **tolerances)
 
 
 def are_two_webpages_look_same(
     base_image_name_with_ext: str,
     selenium_generics: SeleniumGenerics,
+    **tolerances,
 ):
     file_pths = visual_utils.file_paths(base_image_name_with_ext)
     assert (
         file_pths.base.is_file()
     ), f"Base Image Not present at location {file_pths.base}"
 
-    selenium_generics.full_screenshot(file_pths.test, scroll_delay=1.0)
-    return visual_utils.are_images_same(base_image_name_with_ext)
+    selenium_generics.full_screenshot(file_pths.test)
+    return visual_utils.are_images_same(base_image_name_with_ext, **tolerances)
@@ -10,14 +10,23 @@ from main.ui.common.helpers.mobile_app import App
 logger = structlog.get_logger(__name__)
 
 
+CHROMIUM_BROWSERS = ("chrome", "microsoftedge", "msedge", "edge")
+
+
 class SeleniumGenerics(BrowserInteraction, ElementInteraction, App):
-    def __init__(self, driver: WebDriver):
+    def __init__(self, driver: WebDriver, in_browser_waits: bool = False):
         self._os = (
             re.sub(r"[\s]*", "", driver.capabilities["platformName"].lower())
             if "platformName" in driver.capabilities
             else re.sub(r"[\s]*", "", driver.capabilities["platform"].lower())
         )
         self._device = "mobile" if self._os in ["android", "ios"] else "desktop"
+        # MutationObserver based waits are only used on desktop Chromium browsers
+        self.in_browser_waits = (
+            in_browser_waits
+            and self._device == "desktop"
+            and driver.capabilities.get("browserName", "").lower() in CHROMIUM_BROWSERS
+        )
 
         self._selenium = driver
         self._custom_wait = CustomWait(driver)
@@ -1,9 +1,10 @@
+import base64
 import typing
 import time
 from pathlib import Path
-from PIL import Image
-from io import BytesIO
 
+import cv2
+import numpy
 import structlog
 from selenium.common import exceptions as selenium_exceptions
 from selenium.webdriver.remote.webdriver import WebDriver
@@ -152,31 +153,76 @@ class BrowserInteraction:
     def set_fullscreen_window(self):
         self.driver.fullscreen_window()
 
-    def full_screenshot(self, file_path_to_save: Path, scroll_delay: float):
-        device_pixel_ratio = self.driver.execute_script('return window.devicePixelRatio')
-
-        total_height = self.driver.execute_script('return document.body.parentNode.scrollHeight')
-        viewport_height = self.driver.execute_script('return window.innerHeight')
-        total_width = self.driver.execute_script('return document.body.offsetWidth')
-        viewport_width = self.driver.execute_script("return document.body.clientWidth")
-
-        assert (viewport_width == total_width)
-
+    def _full_screenshot_cdp(self, file_path_to_save: Path) -> bool:
+        # Chromium only: the whole page is rendered in a single capture, without scrolling
+        if not hasattr(self.driver, "execute_cdp_cmd"):
+            return False
+        try:
+            metrics = self.driver.execute_cdp_cmd("Page.getLayoutMetrics", {})
+            content_size = metrics.get("cssContentSize", metrics.get("contentSize"))
+            screenshot = self.driver.execute_cdp_cmd("Page.captureScreenshot", {
+                "format": "png",
+                "captureBeyondViewport": True,
+                "fromSurface": True,
+                "clip": {"x": 0, "y": 0, "width": content_size["width"], "height": content_size["height"], "scale": 1},
+            })
+        except selenium_exceptions.WebDriverException as error:
+            logger.debug("CDP full page screenshot not available, falling back to scrolling", error=str(error))
+            return False
+        with open(file_path_to_save, "wb") as file:
+            file.write(base64.b64decode(screenshot["data"]))
+        return True
+
+    def _scroll_and_wait_for_paint(self, offset: int):
+        # resolves once the scroll position is applied and two animation frames have been painted
+        self.driver.execute_async_script(
+            "const done = arguments[arguments.length - 1];"
+            "window.scrollTo(0, arguments[0]);"
+            "requestAnimationFrame(() => requestAnimationFrame(() => done(window.scrollY)));",
+            offset,
+        )
+
+    def full_screenshot(self, file_path_to_save: Path, scroll_delay: float = 0.0):
+        if self._full_screenshot_cdp(file_path_to_save):
+            return
+
+        page = self.driver.execute_script(
+            "return {"
+            "ratio: window.devicePixelRatio,"
+            "totalHeight: document.body.parentNode.scrollHeight,"
+            "viewportHeight: window.innerHeight,"
+            "totalWidth: document.body.offsetWidth,"
+            "viewportWidth: document.body.clientWidth"
+            "};"
+        )
+        device_pixel_ratio = page["ratio"]
+        total_height, viewport_height = page["totalHeight"], page["viewportHeight"]
+        total_width = page["totalWidth"]
+
+        assert (page["viewportWidth"] == total_width)
+
+        # every slice is decoded straight into its rows of the preallocated page buffer
+        stitched_image = None
         offset = 0  # height
-        slices = {}
         while offset < total_height:
             if offset + viewport_height > total_height:
-                offset = total_height - viewport_height
-
-            self.driver.execute_script('window.scrollTo({0}, {1})'.format(0, offset))
-            time.sleep(scroll_delay)
-
-            img = Image.open(BytesIO(self.driver.get_screenshot_as_png()))
-            slices[offset] = img
+                offset = max(total_height - viewport_height, 0)
+
+            self._scroll_and_wait_for_paint(offset)
+            if scroll_delay:
+                time.sleep(scroll_delay)
+
+            png = numpy.frombuffer(self.driver.get_screenshot_as_png(), dtype=numpy.uint8)
+            img = cv2.imdecode(png, cv2.IMREAD_COLOR)
+            if stitched_image is None:
+                stitched_image = numpy.zeros(
+                    (int(round(total_height * device_pixel_ratio)), img.shape[1], 3), dtype=numpy.uint8
+                )
+            top = int(round(offset * device_pixel_ratio))
+            rows = min(img.shape[0], stitched_image.shape[0] - top)
+            stitched_image[top:top + rows] = img[:rows]
 
             offset = offset + viewport_height
 
-        stitched_image = Image.new('RGB', (total_width * device_pixel_ratio, total_height * device_pixel_ratio))
-        for offset, image in slices.items():
-            stitched_image.paste(image, (0, offset * device_pixel_ratio))
-        stitched_image.save(file_path_to_save)
+        if stitched_image is not None:
+            cv2.imwrite(str(file_path_to_save), stitched_image)
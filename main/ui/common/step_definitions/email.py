@@ -9,6 +9,7 @@ from pytest_bdd import parsers, when, then
 from main.ui.common.helpers.selenium_generics import SeleniumGenerics
 
 from main.ui.common.step_definitions import store_env_variable_in_local_env
+from main.utils.context_store import context_store
 from main.utils.email_reader import create_json
 
 logger = structlog.get_logger(__name__)
@@ -57,7 +58,7 @@ def check_email(user_type, selenium_generics: SeleniumGenerics):
                     if 'Test Project Data' in j or 'Test Data' in j:
                         new_url = j
                 final_url = str(new_url).replace('amp;', '')
-                os.environ['FINAL_URL'] = final_url
+                context_store.set('FINAL_URL', final_url)
             if final_url != "":
                 selenium_generics.navigate_to_url(final_url)
             break
@@ -7,20 +7,39 @@ from pytest_check import check
 from main.ui.common.helpers.selenium_generics import SeleniumGenerics
 from main.ui.common.utils.locator_parser import Locators
 from main.ui.common.helpers.single import are_two_images_look_same
+from main.ui.common.utils.visual_utils import parse_ignore_regions
 from main.utils.gherkin_utils import data_table_horizontal_converter
 from main.ui.common.helpers.comparison import (are_two_webelements_look_same, are_two_webpages_look_same)
 
 logger = structlog.get_logger(__name__)
 
 
-@then(parsers.re("(With soft assertion '(?P<soft_assert>.*)' )?I verify images '(?P<name>.*)' have no visual regression"))
-def image_visual_is_valid(soft_assert: str, name):
+def _visual_tolerances(data_table: dict) -> dict:
+    # Optional data table columns: pixel_tolerance, max_diff_percent, ssim_threshold and
+    # ignore_regions given as 'x,y,width,height' regions separated by ';'
+    tolerances = {}
+    if data_table.get("pixel_tolerance", [""])[0]:
+        tolerances["pixel_tolerance"] = int(data_table["pixel_tolerance"][0])
+    if data_table.get("max_diff_percent", [""])[0]:
+        tolerances["max_diff_percent"] = float(data_table["max_diff_percent"][0])
+    if data_table.get("ssim_threshold", [""])[0]:
+        tolerances["ssim_threshold"] = float(data_table["ssim_threshold"][0])
+    if data_table.get("ignore_regions", [""])[0]:
+        tolerances["ignore_regions"] = parse_ignore_regions(data_table["ignore_regions"][0])
+    return tolerances
 
+
+@then(parsers.re("(With soft assertion '(?P<soft_assert>.*)' )?I verify images '(?P<name>.*)' have no visual regression(:(?P<data_table>.*))?",
+                 flags=re.S), )
+def image_visual_is_valid(soft_assert: str, name, data_table: str):
+    # the data table of tolerances is optional for this step
+    tolerances = _visual_tolerances(data_table_horizontal_converter(data_table)) \
+        if data_table and data_table.strip() else {}
     if soft_assert is not None and soft_assert.lower() == 'true':
         with check:
-            assert are_two_images_look_same(name)
+            assert are_two_images_look_same(name, **tolerances)
     else:
-        assert are_two_images_look_same(name)
+        assert are_two_images_look_same(name, **tolerances)
 
 
 @then(parsers.re("(With soft assertion '(?P<soft_assert>.*)' )?I verify that element '(?P<locator_path>.*)' is not visually regressed:(?P<data_table>.*)",
@@ -29,9 +48,11 @@ def element_visual_is_valid(selenium_generics: SeleniumGenerics, locators: Locat
     locator = locators.parse_and_get(locator_path, selenium_generics)
     if soft_assert is not None and soft_assert.lower() == 'true':
         with check:
-            assert are_two_webelements_look_same(data_table["base_image"][0], selenium_generics, locator)
+            assert are_two_webelements_look_same(data_table["base_image"][0], selenium_generics, locator,
+                                                 **_visual_tolerances(data_table))
     else:
-        assert are_two_webelements_look_same(data_table["base_image"][0], selenium_generics, locator)
+        assert are_two_webelements_look_same(data_table["base_image"][0], selenium_generics, locator,
+                                             **_visual_tolerances(data_table))
 
 
 @then(parsers.re("(With soft assertion '(?P<soft_assert>.*)' )?I verify the page is not visually regressed:(?P<data_table>.*)", flags=re.S),
@@ -39,6 +60,8 @@ def element_visual_is_valid(selenium_generics: SeleniumGenerics, locators: Locat
 def page_visual_is_valid(selenium_generics: SeleniumGenerics, soft_assert: str, data_table: dict):
     if soft_assert is not None and soft_assert.lower() == 'true':
         with check:
-            assert are_two_webpages_look_same(data_table["base_image"][0], selenium_generics)
+            assert are_two_webpages_look_same(data_table["base_image"][0], selenium_generics,
+                                              **_visual_tolerances(data_table))
     else:
-        assert are_two_webpages_look_same(data_table["base_image"][0], selenium_generics)
+        assert are_two_webpages_look_same(data_table["base_image"][0], selenium_generics,
+                                          **_visual_tolerances(data_table))
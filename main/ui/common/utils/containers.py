@@ -21,6 +21,8 @@ class ValidLocatorTypes(Enum):
 
 
 class Locator:
+    __slots__ = ("_type", "identifier")
+
     def __init__(self, type: ValidLocatorTypes, identifier: str):
         self.type = type
         self.identifier = identifier
@@ -1,8 +1,12 @@
+import hashlib
 import json
 import os
+import pickle
 import re
+import sys
 import typing
-from collections import deque
+from collections import defaultdict
+from functools import lru_cache
 from glob import glob
 from pathlib import Path
 import structlog
@@ -14,12 +18,16 @@ logger = structlog.get_logger(__name__)
 
 __all__ = ["parse_locator", "Locators"]
 
+LOCATOR_TYPE_PATTERN = re.compile("^(XP|TN|ID|CS|CN|NM|LT|PL)(.+)$")
+LOCATORS_CACHE_DIR = Path(os.getcwd()) / "output_data" / ".cache" / "locators"
+LOCATORS_MANIFEST_FILE = "manifest.pickle"
+
 
 def _parse_locator_string(
     locator_string: str, default_loc_type=ValidLocatorTypes.XP
 ) -> Locator:
     if (
-        match := re.match("^[(XP|TN|ID|CS|CN|NM|LT|PL)](.+)$", locator_string)
+        match := LOCATOR_TYPE_PATTERN.match(locator_string)
     ) is not None:
         type_ = getattr(ValidLocatorTypes, match.groups()[0])
         identifier = match.groups()[1]
@@ -37,27 +45,66 @@ def _parse_shadow_locator_string(
     return ShadowLocator(locators)
 
 
+@lru_cache(maxsize=4096)
 def parse_locator(
     locator: str, shadow_loc_delimiter: str = " ~ "
 ) -> typing.Union[Locator, ShadowLocator]:
+    # memoized: the same locator string always returns the same (not to be mutated) locator object
     is_shadow_loc = shadow_loc_delimiter in locator
     if is_shadow_loc:
         return _parse_shadow_locator_string(locator, shadow_loc_delimiter)
     return _parse_locator_string(locator)
 
 
+def _read_pickle(file_path: Path):
+    try:
+        with open(file_path, "rb") as handle:
+            return pickle.load(handle)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        return None
+
+
+def _write_pickle(file_path: Path, data):
+    # written to a temporary file first, since xdist workers may write the same cache file
+    try:
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = file_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_file, "wb") as handle:
+            pickle.dump(data, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, file_path)
+    except OSError:
+        logger.debug("Locators cache file could not be written", file=str(file_path))
+
+
 class Locators:
+    """Locator files are loaded lazily: only the file contributing the top level key (namespace) of a
+    requested locator is read, the first time a locator of that namespace is requested.
+
+    Each file is compiled into a flat {full key path: locator} index per namespace, with the locale already
+    applied. The compiled files are cached in LOCATORS_CACHE_DIR by path, mtime & size, together with a
+    manifest of the namespaces of each file, so unchanged files are not parsed again by the xdist workers
+    and the next runs.
+    """
+
     def __init__(
         self,
         locators_base_path: typing.Union[str, None] = None,
         delimiter: str = " > ",
         locale: str = "en_US",
+        cache_dir: typing.Union[Path, None] = LOCATORS_CACHE_DIR,
     ):
         self.locators_base_path = locators_base_path
-        self.locators_files = self.get_locator_files()
-        self.loaded_locators = self.load_locators()
         self.delimiter = delimiter
         self.locale: str = locale
+        self.cache_dir = cache_dir
+        self.locators_files = self.get_locator_files()
+        # files compiled while building the manifest, kept until their namespaces are loaded
+        self._compiled = dict()
+        self.file_keys = self._load_manifest()
+        self.namespaces = self._map_namespaces()
+        self._index = dict()
+        self._loaded_files = set()
+        self._loaded_locators = None
 
     @staticmethod
     def _load_data_file(file_path: str):
@@ -94,13 +141,104 @@ class Locators:
 
         return locator_files
 
-    def load_locators(self):
-        locator_dict = dict()
+    def _cached_file_path(self, file_path: str) -> Path:
+        return self.cache_dir / f"{hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()}.pickle"
+
+    @staticmethod
+    def _file_stamp(file_path: str) -> tuple:
+        stat = os.stat(file_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _compile_file(self, file_path: str) -> typing.Dict[str, dict]:
+        """{namespace: {full key path: locator}} of the file, read from the cache when the file is unchanged."""
+        if file_path in self._compiled:
+            return self._compiled[file_path]
+        signature = (self._file_stamp(file_path), self.delimiter, self.locale)
+        if self.cache_dir is not None:
+            cached = _read_pickle(self._cached_file_path(file_path))
+            if cached and cached.get("signature") == signature:
+                return cached["namespaces"]
+        namespaces = dict()
+        for key, node in self._load_data_file(file_path).items():
+            namespaces[key] = dict()
+            self._flatten(node, key, namespaces[key])
+        if self.cache_dir is not None:
+            _write_pickle(self._cached_file_path(file_path), {"signature": signature, "namespaces": namespaces})
+        return namespaces
+
+    def _load_manifest(self) -> typing.Dict[str, typing.Tuple[str, ...]]:
+        """{locator file: top level keys of the file}. Only new or modified files are compiled, the entries of
+        the deleted files are removed."""
+        manifest_file = self.cache_dir / LOCATORS_MANIFEST_FILE if self.cache_dir is not None else None
+        cached_manifest = (_read_pickle(manifest_file) if manifest_file else None) or {}
+        manifest, file_keys, is_modified = {}, {}, False
         for file in self.locators_files:
-            locator_dict.update(self._load_data_file(file))
-        if not locator_dict:
+            abs_path = os.path.abspath(file)
+            stamp = self._file_stamp(file)
+            entry = cached_manifest.get(abs_path)
+            if not entry or entry[0] != stamp:
+                self._compiled[file] = self._compile_file(file)
+                entry = (stamp, tuple(self._compiled[file]))
+                is_modified = True
+            manifest[abs_path] = entry
+            file_keys[file] = entry[1]
+        if manifest_file:
+            # the manifest is shared by the locator folders of the project, other folders keep their entries
+            for abs_path, entry in cached_manifest.items():
+                if abs_path in manifest:
+                    continue
+                if os.path.exists(abs_path):
+                    manifest[abs_path] = entry
+                else:
+                    is_modified = True
+                    self._cached_file_path(abs_path).unlink(missing_ok=True)
+            if is_modified:
+                _write_pickle(manifest_file, manifest)
+        return file_keys
+
+    def _map_namespaces(self) -> typing.Dict[str, str]:
+        namespaces, contributors = dict(), defaultdict(list)
+        for file, keys in self.file_keys.items():
+            for key in keys:
+                # same as merging the files in order: the last file defining a namespace wins
+                namespaces[key] = file
+                contributors[key].append(file)
+        if not namespaces:
             raise LocatorException("Locator Files Empty!!!")
-        return locator_dict
+        for key, files in contributors.items():
+            if len(files) > 1:
+                logger.warning("Locator namespace defined in several files, the last one is used",
+                               namespace=key, files=files)
+        return namespaces
+
+    def _load_namespace(self, namespace: str):
+        file = self.namespaces.get(namespace)
+        if file is None or file in self._loaded_files:
+            return
+        self._loaded_files.add(file)
+        for key, index in self._compile_file(file).items():
+            if self.namespaces.get(key) == file:
+                self._index.update(index)
+        self._compiled.pop(file, None)
+
+    @property
+    def loaded_locators(self) -> dict:
+        """The merged locator tree, as in the locator files. Reads every locator file the first time it is used,
+        prefer parse_and_get which only loads the namespace of the locator."""
+        if self._loaded_locators is None:
+            self._loaded_locators = dict()
+            for file in self.locators_files:
+                self._loaded_locators.update(self._load_data_file(file))
+        return self._loaded_locators
+
+    def _flatten(self, node, key_path: str, index: dict):
+        node = self._get_locale_based_locator(node, self.locale)
+        if isinstance(node, str):
+            node = sys.intern(node)
+        index[sys.intern(key_path)] = node
+        if isinstance(node, dict):
+            for key, child in node.items():
+                self._flatten(child, f"{key_path}{self.delimiter}{key}", index)
 
     @staticmethod
     def _get_locale_based_locator(locators: dict, locale: str):
@@ -112,13 +250,14 @@ class Locators:
         if "_os_locator" in locator_key:
             locator_key = f"{locator_key.split('_os_locator')[0]}{'_android'}" if selenium_generics.is_android() else \
                 f"{locator_key.split('_os_locator')[0]}{'_ios'}"
-        key_hier = deque(locator_key.split(self.delimiter))
-        loc = self.loaded_locators.get(key_hier.popleft())
-        while key_hier:
-            loc = self._get_locale_based_locator(loc, self.locale)
-            loc = loc.get(key_hier.popleft())
-        loc = self._get_locale_based_locator(loc, self.locale)
-        return loc
+        try:
+            return self._index[locator_key]
+        except KeyError:
+            self._load_namespace(locator_key.split(self.delimiter, 1)[0])
+        try:
+            return self._index[locator_key]
+        except KeyError:
+            raise LocatorException(f"Locator '{locator_key}' not found in the locator files") from None
 
     @staticmethod
     def get_radio_option_from_parent(option_attribute, text, parent_attribute, value):
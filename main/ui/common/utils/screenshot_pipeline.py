@@ -0,0 +1,150 @@
+import base64
+import hashlib
+import queue
+import threading
+import typing
+from io import BytesIO
+from uuid import uuid4
+
+import structlog
+from allure_commons import plugin_manager
+from allure_commons.types import AttachmentType
+from PIL import Image
+
+logger = structlog.get_logger(__name__)
+
+__all__ = ["ScreenshotPolicy", "ScreenshotPipeline", "get_screenshot_pipeline", "close_screenshot_pipeline"]
+
+
+class ScreenshotPolicy:
+    ALWAYS = "always"
+    ON_FAILURE = "on-failure"
+    EVERY_NTH = "every-n"
+
+    choices = (ALWAYS, ON_FAILURE, EVERY_NTH)
+
+
+class ScreenshotPipeline:
+    """Captures step screenshots on the test thread and hands decoding, downsampling and
+    writing of the Allure attachment over to a pool of background workers."""
+
+    def __init__(
+        self,
+        policy: str = ScreenshotPolicy.ALWAYS,
+        every_nth: int = 1,
+        scale: float = 1.0,
+        workers: int = 2,
+        queue_size: int = 16,
+    ):
+        if policy not in ScreenshotPolicy.choices:
+            raise ValueError(f"Invalid screenshot policy: {policy}. Valid policies: {ScreenshotPolicy.choices}")
+        self.policy = policy
+        self.every_nth = max(int(every_nth), 1)
+        self.scale = float(scale)
+        self._queue: queue.Queue = queue.Queue(maxsize=max(int(queue_size), 1))
+        self._step_counters: typing.Dict[str, int] = {}
+        self._last_digests: typing.Dict[str, str] = {}
+        self._workers = [
+            threading.Thread(target=self._work, name=f"screenshot-worker-{idx}", daemon=True)
+            for idx in range(max(int(workers), 1))
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def should_capture(self, scenario_key: str) -> bool:
+        if self.policy == ScreenshotPolicy.ON_FAILURE:
+            return False
+        count = self._step_counters.get(scenario_key, 0) + 1
+        self._step_counters[scenario_key] = count
+        if self.policy == ScreenshotPolicy.EVERY_NTH:
+            return count % self.every_nth == 0
+        return True
+
+    def capture(self, driver, scenario_key: str, name: str, *, dedupe: bool = True):
+        """Takes the screenshot (one WebDriver round-trip) and queues it for processing.
+        A frame identical to the previous one of the same scenario is not attached again."""
+        screenshot_source = driver.get_screenshot_as_base64()
+        digest = hashlib.sha1(screenshot_source.encode("ascii")).hexdigest()
+        if dedupe and self._last_digests.get(scenario_key) == digest:
+            logger.debug("Skipping duplicated step screenshot", name=name)
+            return
+        self._last_digests[scenario_key] = digest
+
+        file_name = _reserve_allure_attachment(name)
+        if file_name is None:
+            return
+        self._queue.put((file_name, screenshot_source))
+
+    def reset(self, scenario_key: str):
+        self._step_counters.pop(scenario_key, None)
+        self._last_digests.pop(scenario_key, None)
+
+    def close(self):
+        """Waits for all queued screenshots to be written and stops the workers."""
+        self._queue.join()
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                file_name, screenshot_source = item
+                plugin_manager.hook.report_attached_data(body=self._process(screenshot_source), file_name=file_name)
+            except Exception as error:
+                logger.error("Failed to write step screenshot", error=str(error))
+            finally:
+                self._queue.task_done()
+
+    def _process(self, screenshot_source: str) -> bytes:
+        png = base64.b64decode(screenshot_source)
+        if self.scale >= 1.0:
+            return png
+        with Image.open(BytesIO(png)) as img:
+            size = (max(int(img.width * self.scale), 1), max(int(img.height * self.scale), 1))
+            resized = img.resize(size, Image.BILINEAR)
+        output = BytesIO()
+        resized.save(output, format="PNG")
+        return output.getvalue()
+
+
+def _allure_lifecycle():
+    for plugin in plugin_manager.get_plugins():
+        lifecycle = getattr(plugin, "lifecycle", None)
+        if lifecycle is not None:
+            return lifecycle
+    return None
+
+
+def _reserve_allure_attachment(name: str) -> typing.Union[str, None]:
+    # The attachment has to be registered on the test thread, since the Allure lifecycle keeps the
+    # current test/step per thread. Only the file content is written later by the workers.
+    lifecycle = _allure_lifecycle()
+    if lifecycle is None:
+        return None
+    return lifecycle._attach(uuid4(), name=name, attachment_type=AttachmentType.PNG)
+
+
+def get_screenshot_pipeline(config) -> ScreenshotPipeline:
+    pipeline = getattr(config, "_screenshot_pipeline", None)
+    if pipeline is None:
+        pipeline = ScreenshotPipeline(
+            policy=config.getoption("step_screenshots"),
+            every_nth=config.getoption("step_screenshots_interval"),
+            scale=config.getoption("step_screenshots_scale"),
+            workers=config.getoption("screenshot_workers"),
+            queue_size=config.getoption("screenshot_queue_size"),
+        )
+        config._screenshot_pipeline = pipeline
+    return pipeline
+
+
+def close_screenshot_pipeline(config):
+    pipeline = getattr(config, "_screenshot_pipeline", None)
+    if pipeline is not None:
+        pipeline.close()
+        del config._screenshot_pipeline
@@ -0,0 +1,212 @@
+import json
+import threading
+import time
+import typing
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+__all__ = ["PooledSession", "SessionPool", "session_key", "reset_session", "is_session_alive", "is_poolable_session"]
+
+# Capabilities which only name/annotate the remote session and do not change the browser itself
+_SESSION_LABEL_CAPABILITIES = ("name", "sessionName", "buildName", "build", "build_name")
+
+# The cookies and the storage of every origin can only be cleared through the DevTools protocol,
+# the WebDriver commands only reach the origin of the current page
+_CHROMIUM_BROWSERS = ("chrome", "chromium", "msedge", "microsoftedge", "edge")
+_MOBILE_PLATFORMS = ("android", "ios")
+
+
+class PooledSession:
+    __slots__ = ("driver", "key", "uses", "created", "window_size")
+
+    def __init__(self, driver, key: str, window_size: typing.Union[dict, None] = None):
+        self.driver = driver
+        self.key = key
+        self.uses = 0
+        self.created = time.monotonic()
+        self.window_size = window_size
+
+
+def _strip_session_labels(capabilities: dict) -> dict:
+    stripped = {}
+    for name, value in capabilities.items():
+        if name in _SESSION_LABEL_CAPABILITIES:
+            continue
+        stripped[name] = _strip_session_labels(value) if isinstance(value, dict) else value
+    return stripped
+
+
+def session_key(driver_name: str, driver_kwargs: dict) -> str:
+    """Sessions created with the same driver, executor and capabilities are interchangeable."""
+    options = driver_kwargs.get("options", None)
+    capabilities = options.to_capabilities() if options is not None else driver_kwargs.get("capabilities", None) or {}
+    return json.dumps(
+        {
+            "driver": driver_name,
+            "executor": str(driver_kwargs.get("command_executor", "")),
+            "capabilities": _strip_session_labels(capabilities),
+            "arguments": sorted(getattr(options, "arguments", []) or []),
+        },
+        sort_keys=True,
+        default=str,
+    )
+
+
+def _has_device_name(capabilities: dict) -> bool:
+    # deviceName, appium:deviceName or bstack:options.deviceName
+    return any(
+        name.split(":")[-1] == "deviceName" or (isinstance(value, dict) and _has_device_name(value))
+        for name, value in capabilities.items()
+    )
+
+
+def is_poolable_session(capabilities: dict) -> bool:
+    """Only the desktop Chromium sessions are pooled, as they are the only ones which can be fully reset."""
+    browser_name = str(capabilities.get("browserName", "")).lower()
+    platform_name = str(capabilities.get("platformName", "")).lower()
+    return (
+        browser_name in _CHROMIUM_BROWSERS
+        and platform_name not in _MOBILE_PLATFORMS
+        and not _has_device_name(capabilities)
+    )
+
+
+def _execute_cdp(driver, command: str, params: dict) -> dict:
+    if hasattr(driver, "execute_cdp_cmd"):
+        return driver.execute_cdp_cmd(command, params)
+    # remote Chromium sessions, the command is registered by the Chromium remote connection
+    return driver.execute("executeCdpCommand", {"cmd": command, "params": params})["value"]
+
+
+def _origin(url: str) -> typing.Union[str, None]:
+    parts = urlsplit(url or "")
+    return f"{parts.scheme}://{parts.netloc}" if parts.scheme in ("http", "https") and parts.netloc else None
+
+
+def _frame_urls(frame_tree: dict) -> typing.Iterator[str]:
+    yield frame_tree["frame"].get("url", "")
+    for child in frame_tree.get("childFrames", []):
+        yield from _frame_urls(child)
+
+
+def _window_origins(driver) -> typing.Set[str]:
+    """Origins of the pages the current window went through and of the frames of its current page."""
+    history = _execute_cdp(driver, "Page.getNavigationHistory", {})
+    urls = [entry.get("url", "") for entry in history.get("entries", [])]
+    urls.extend(_frame_urls(_execute_cdp(driver, "Page.getFrameTree", {})["frameTree"]))
+    return {origin for origin in map(_origin, urls) if origin}
+
+
+def is_session_alive(driver) -> bool:
+    try:
+        return bool(driver.session_id) and driver.current_window_handle is not None
+    except Exception:
+        return False
+
+
+def reset_session(driver, window_size: typing.Union[dict, None] = None):
+    """Brings a used browser session back to a blank state: a single window, no cookies, no storage
+    for any of the origins visited by the windows and the original window size."""
+    handles = driver.window_handles
+    origins = set()
+    for handle in handles:
+        driver.switch_to.window(handle)
+        origins.update(_window_origins(driver))
+    # a new tab starts without history and session storage
+    driver.switch_to.new_window("tab")
+    blank_handle = driver.current_window_handle
+    for handle in handles:
+        driver.switch_to.window(handle)
+        driver.close()
+    driver.switch_to.window(blank_handle)
+
+    # the cookies of every domain, then the local storage, IndexedDB, service workers and cache storage of each origin
+    _execute_cdp(driver, "Network.clearBrowserCookies", {})
+    for origin in sorted(origins):
+        _execute_cdp(driver, "Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+
+    if window_size:
+        driver.set_window_size(window_size["width"], window_size["height"])
+
+
+class SessionPool:
+    """Keeps live WebDriver sessions between scenarios, grouped by session key.
+
+    A session is handed out again only after it has been reset and passed a health check,
+    and it is quit once it has been used max_reuse times.
+    """
+
+    def __init__(self, max_reuse: int = 20):
+        self.max_reuse = max(int(max_reuse), 1)
+        self._idle: typing.Dict[str, typing.List[PooledSession]] = defaultdict(list)
+        self._in_use: typing.Dict[int, PooledSession] = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def acquire(self, key: str, factory: typing.Callable):
+        while True:
+            with self._lock:
+                session = self._idle[key].pop() if self._idle[key] else None
+            if session is None:
+                break
+            if is_session_alive(session.driver):
+                self.reused += 1
+                return self._check_out(session)
+            logger.warning("Discarding unhealthy pooled browser session", session_id=session.driver.session_id)
+            self._quit(session)
+
+        driver = factory()
+        self.created += 1
+        try:
+            window_size = driver.get_window_size()
+        except Exception:
+            window_size = None
+        return self._check_out(PooledSession(driver, key, window_size))
+
+    def release(self, driver, discard: bool = False):
+        """Returns the session to the pool, or quits it when it is discarded, worn out or can not be reset."""
+        with self._lock:
+            session = self._in_use.pop(id(driver), None)
+        if session is None:
+            driver.quit()
+            return
+        if discard or session.uses >= self.max_reuse:
+            self._quit(session)
+            return
+        try:
+            reset_session(session.driver, session.window_size)
+        except Exception as error:
+            logger.warning("Browser session could not be reset, discarding it", error=str(error))
+            self._quit(session)
+            return
+        with self._lock:
+            self._idle[session.key].append(session)
+
+    def close(self):
+        with self._lock:
+            sessions = [session for idle in self._idle.values() for session in idle]
+            sessions.extend(self._in_use.values())
+            self._idle.clear()
+            self._in_use.clear()
+        for session in sessions:
+            self._quit(session)
+        if self.created:
+            logger.info("Browser session pool closed", created=self.created, reused=self.reused)
+
+    def _check_out(self, session: PooledSession):
+        session.uses += 1
+        with self._lock:
+            self._in_use[id(session.driver)] = session
+        return session.driver
+
+    @staticmethod
+    def _quit(session: PooledSession):
+        try:
+            session.driver.quit()
+        except Exception as error:
+            logger.debug("Pooled browser session already closed", error=str(error))
@@ -0,0 +1,136 @@
+import argparse
+import json
+import os
+import shutil
+import typing
+from concurrent.futures import ProcessPoolExecutor
+
+import structlog
+
+from main.ui.common.utils import visual_utils
+
+logger = structlog.get_logger(__name__)
+
+__all__ = ["image_pairs", "run_visual_batch", "main"]
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+SUMMARY_FILE_NAME = "summary.json"
+
+
+def image_pairs() -> typing.List[str]:
+    """Names of the images present in both the base and the test folders."""
+    base_dir = visual_utils.file_paths("").base
+    test_dir = visual_utils.file_paths("").test
+    if not base_dir.is_dir() or not test_dir.is_dir():
+        return []
+    with os.scandir(test_dir) as entries:
+        test_images = {entry.name for entry in entries if entry.is_file()}
+    with os.scandir(base_dir) as entries:
+        return sorted(
+            entry.name for entry in entries
+            if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS) and entry.name in test_images
+        )
+
+
+def _compare_pair(image_name_with_ext: str, color_mode: str, tolerances: dict) -> dict:
+    # runs in a worker process, only plain data is sent back to the parent
+    # the color mode & tolerances of the step which took the image replace the batch ones
+    settings = visual_utils.load_comparison_settings(image_name_with_ext)
+    if settings is not None:
+        color_mode, tolerances = settings["color_mode"], {**tolerances, **settings["tolerances"]}
+    try:
+        result = visual_utils.compare_image_files(image_name_with_ext, color_mode, **tolerances)
+    except Exception as error:
+        return {"image": image_name_with_ext, "status": "error", "error": f"{type(error).__name__}: {error}"}
+    return {
+        "image": image_name_with_ext,
+        "status": "passed" if result.is_same else "failed",
+        "color_mode": color_mode,
+        "tolerances": tolerances,
+        "changed_pixels": result.changed_pixels,
+        "changed_percent": round(result.changed_percent, 4),
+        "max_delta": result.max_delta,
+        "ssim": result.ssim,
+        "diff_image": str(visual_utils.file_paths(image_name_with_ext).diff) if result.diff_image is not None else None,
+    }
+
+
+def run_visual_batch(
+    workers: typing.Optional[int] = None,
+    color_mode: str = "RGB",
+    approve: bool = False,
+    **tolerances,
+) -> dict:
+    """Compares every base/test image pair in a process pool and writes the summary next to the diff images.
+    The pairs compared by a step use the color mode and tolerances of that step, the others color_mode and
+    tolerances. With approve, the test image of every failed pair becomes the new base image."""
+    names = image_pairs()
+    workers = workers or os.cpu_count() or 1
+    logger.info("Visual batch comparison started", images=len(names), workers=workers)
+
+    results = []
+    if names:
+        with ProcessPoolExecutor(max_workers=min(workers, len(names))) as executor:
+            results = list(executor.map(
+                _compare_pair,
+                names,
+                [color_mode] * len(names),
+                [tolerances] * len(names),
+                chunksize=max(len(names) // (workers * 4), 1),
+            ))
+
+    if approve:
+        for result in results:
+            if result["status"] == "failed":
+                paths = visual_utils.file_paths(result["image"])
+                shutil.copyfile(paths.test, paths.base)
+                result["approved"] = True
+
+    summary = {
+        "total": len(results),
+        "passed": sum(1 for result in results if result["status"] == "passed"),
+        "failed": sum(1 for result in results if result["status"] == "failed"),
+        "errors": sum(1 for result in results if result["status"] == "error"),
+        "tolerances": tolerances,
+        "results": results,
+    }
+    summary_path = visual_utils.file_paths(SUMMARY_FILE_NAME).diff
+    summary_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(summary_path, "w", encoding="utf-8") as summary_file:
+        json.dump(summary, summary_file, indent=2)
+    logger.info("Visual batch comparison completed", summary=str(summary_path), passed=summary["passed"],
+                failed=summary["failed"], errors=summary["errors"])
+    return summary
+
+
+def main(argv: typing.Optional[typing.List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare every image of test_data/visualtesting/test with its base")
+    parser.add_argument("--workers", type=int, default=None, help="Number of processes (default: number of cores)")
+    parser.add_argument("--color-mode", default="RGB", choices=("RGB", "RGBA", "L"))
+    parser.add_argument("--pixel-tolerance", type=int, default=0)
+    parser.add_argument("--max-diff-percent", type=float, default=0.0)
+    parser.add_argument("--ssim-threshold", type=float, default=None)
+    parser.add_argument("--ignore-regions", type=visual_utils.parse_ignore_regions, default=(),
+                        help="Regions to ignore as 'x,y,width,height' separated by ';'")
+    parser.add_argument("--approve", action="store_true", help="Replace the base image of every failed comparison")
+    args = parser.parse_args(argv)
+
+    summary = run_visual_batch(
+        workers=args.workers,
+        color_mode=args.color_mode,
+        approve=args.approve,
+        pixel_tolerance=args.pixel_tolerance,
+        max_diff_percent=args.max_diff_percent,
+        ssim_threshold=args.ssim_threshold,
+        ignore_regions=args.ignore_regions,
+    )
+    print(f"{summary['passed']} passed, {summary['failed']} failed, {summary['errors']} errors "
+          f"out of {summary['total']} images")
+    # the approved failures do not fail the run, the comparison errors always do
+    if summary["errors"]:
+        return 1
+    return 0 if args.approve or summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
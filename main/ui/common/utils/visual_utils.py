@@ -1,8 +1,29 @@
 
+import json
+import typing
 from collections import namedtuple
 from pathlib import Path
 
-from PIL import Image, ImageChops
+import cv2
+import numpy
+from PIL import Image
+
+# color mode & tolerances of the last step comparing an image, saved next to its test image
+COMPARISON_SETTINGS_SUFFIX = ".comparison.json"
+
+# Region to be ignored during comparison: x, y, width, height in pixels
+IgnoreRegion = typing.Tuple[int, int, int, int]
+
+DiffResult = namedtuple(
+    "DiffResult",
+    "is_same changed_pixels changed_percent max_delta ssim diff_image",
+)
+
+_CV2_READ_FLAGS = {
+    "L": cv2.IMREAD_GRAYSCALE,
+    "RGB": cv2.IMREAD_COLOR,
+    "RGBA": cv2.IMREAD_UNCHANGED,
+}
 
 
 class FileFormatMismatchError(Exception):
@@ -13,12 +34,6 @@ class ImageSizeMismatchError(Exception):
     pass
 
 
-def read_image(img_pth: Path, color_mode: str = "RGB") -> Image:
-    with Image.open(img_pth) as f:
-        img = f.convert(color_mode)
-    return img
-
-
 def file_paths(image_name_with_ext: str):
     screenshot_paths = namedtuple("screenshot_paths", "base test diff")
     return screenshot_paths(
@@ -58,27 +73,176 @@ def raise_for_size_mismatch(bse_img: Image, tst_img: Image):
         )
 
 
-def _diff_img(bse_img: Image, tst_img: Image) -> Image:
-    diff_img = ImageChops.difference(bse_img, tst_img)
+def read_image_array(img_pth: Path, color_mode: str = "RGB") -> numpy.ndarray:
+    img = cv2.imread(str(img_pth), _CV2_READ_FLAGS.get(color_mode, cv2.IMREAD_COLOR))
+    if img is None:
+        raise FileFormatMismatchError(f"Cannot decode image at location {img_pth}")
+    if color_mode == "RGBA":
+        # IMREAD_UNCHANGED keeps the channels and depth of the file, the images are compared as 8 bit BGRA
+        if img.dtype != numpy.uint8:
+            img = cv2.convertScaleAbs(img, alpha=255.0 / numpy.iinfo(img.dtype).max)
+        if img.ndim == 2:
+            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGRA)
+        elif img.shape[2] == 3:
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2BGRA)
+    return img
+
+
+def raise_for_array_mismatch(bse_img: numpy.ndarray, tst_img: numpy.ndarray):
+    if bse_img.shape[:2] != tst_img.shape[:2]:
+        raise ImageSizeMismatchError(
+            f"Cannot compare images with different sizes. "
+            f"Base Image ({bse_img.shape[1]}, {bse_img.shape[0]}) & "
+            f"Test Image ({tst_img.shape[1]}, {tst_img.shape[0]}) have different sizes."
+        )
+    if bse_img.shape != tst_img.shape or bse_img.dtype != tst_img.dtype:
+        raise FileFormatMismatchError(
+            f"Cannot compare images with different color channels. "
+            f"Base Image ({bse_img.shape}, {bse_img.dtype}) & Test Image ({tst_img.shape}, {tst_img.dtype}) differ."
+        )
+
 
-    # parameter to know if there is a difference - getbbox() is None implies no change in base vs test.
-    is_same = diff_img.getbbox() is None
+def parse_ignore_regions(value: str) -> typing.List[IgnoreRegion]:
+    """'x,y,width,height' regions separated by ';'"""
+    return [tuple(int(v) for v in region.split(",")) for region in value.split(";") if region.strip()]
 
-    if not is_same:
-        return diff_img
-    return None
 
+def _ignore_mask(shape: typing.Tuple[int, int], ignore_regions: typing.Iterable[IgnoreRegion]) -> numpy.ndarray:
+    mask = numpy.zeros(shape, dtype=numpy.uint8)
+    for x, y, width, height in ignore_regions:
+        # both ends are clamped, a negative slice end would count from the end of the image
+        top, bottom = max(int(y), 0), max(int(y) + int(height), 0)
+        left, right = max(int(x), 0), max(int(x) + int(width), 0)
+        if bottom > top and right > left:
+            mask[top:bottom, left:right] = 255
+    return mask
 
-def are_images_same(image_name_with_ext: str, color_mode: str = "RGB") -> bool:
+
+def _to_gray(img: numpy.ndarray) -> numpy.ndarray:
+    if img.ndim == 2:
+        return img
+    return cv2.cvtColor(img, cv2.COLOR_BGRA2GRAY if img.shape[2] == 4 else cv2.COLOR_BGR2GRAY)
+
+
+def _ssim(bse_img: numpy.ndarray, tst_img: numpy.ndarray) -> float:
+    # Gaussian-weighted SSIM (Wang et al.) on the gray scale images, computed with whole-array operations
+    bse = _to_gray(bse_img).astype(numpy.float32)
+    tst = _to_gray(tst_img).astype(numpy.float32)
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    window, sigma = (11, 11), 1.5
+
+    mu_bse = cv2.GaussianBlur(bse, window, sigma)
+    mu_tst = cv2.GaussianBlur(tst, window, sigma)
+    mu_bse_sq, mu_tst_sq, mu_bse_tst = mu_bse * mu_bse, mu_tst * mu_tst, mu_bse * mu_tst
+    sigma_bse_sq = cv2.GaussianBlur(bse * bse, window, sigma) - mu_bse_sq
+    sigma_tst_sq = cv2.GaussianBlur(tst * tst, window, sigma) - mu_tst_sq
+    sigma_bse_tst = cv2.GaussianBlur(bse * tst, window, sigma) - mu_bse_tst
+
+    ssim_map = ((2 * mu_bse_tst + c1) * (2 * sigma_bse_tst + c2)) / (
+        (mu_bse_sq + mu_tst_sq + c1) * (sigma_bse_sq + sigma_tst_sq + c2)
+    )
+    return float(ssim_map.mean())
+
+
+def _heatmap(bse_img: numpy.ndarray, delta: numpy.ndarray) -> numpy.ndarray:
+    # changed pixels are colored by their delta, unchanged ones show the dimmed base image
+    heat = cv2.applyColorMap(cv2.normalize(delta, None, 0, 255, cv2.NORM_MINMAX), cv2.COLORMAP_JET)
+    diff_img = cv2.cvtColor(_to_gray(bse_img) // 2, cv2.COLOR_GRAY2BGR)
+    cv2.copyTo(heat, delta, diff_img)
+    return diff_img
+
+
+def compare_images(
+    bse_img: numpy.ndarray,
+    tst_img: numpy.ndarray,
+    *,
+    pixel_tolerance: int = 0,
+    max_diff_percent: float = 0.0,
+    ssim_threshold: typing.Optional[float] = None,
+    ignore_regions: typing.Iterable[IgnoreRegion] = (),
+) -> DiffResult:
+    """Compares two images of the same size.
+
+    A pixel is counted as changed when any of its channels differs by more than pixel_tolerance.
+    The images are the same when the changed pixels are at most max_diff_percent of the compared
+    pixels and, if ssim_threshold is given, their structural similarity is at least ssim_threshold.
+    Pixels inside ignore_regions are not compared.
+    """
+    raise_for_array_mismatch(bse_img, tst_img)
+    delta = cv2.absdiff(bse_img, tst_img)
+    if delta.ndim == 3:
+        # per pixel maximum over the channels; cv2.max on the split planes is much faster than numpy's max(axis=2)
+        channels = cv2.split(delta)
+        delta = channels[0]
+        for channel in channels[1:]:
+            delta = cv2.max(delta, channel)
+
+    compared_pixels = delta.size
+    ignore_regions = list(ignore_regions or ())
+    if ignore_regions:
+        mask = _ignore_mask(delta.shape, ignore_regions)
+        delta = cv2.bitwise_and(delta, cv2.bitwise_not(mask))
+        compared_pixels -= cv2.countNonZero(mask)
+        if ssim_threshold is not None:
+            tst_img = tst_img.copy()
+            cv2.copyTo(bse_img, mask, tst_img)
+
+    if pixel_tolerance > 0:
+        delta = cv2.threshold(delta, pixel_tolerance, 255, cv2.THRESH_TOZERO)[1]
+    changed_pixels = cv2.countNonZero(delta)
+    changed_percent = (changed_pixels * 100.0 / compared_pixels) if compared_pixels else 0.0
+    ssim = _ssim(bse_img, tst_img) if ssim_threshold is not None else None
+
+    is_same = changed_percent <= max_diff_percent and (ssim is None or ssim >= ssim_threshold)
+    diff_image = None
+    if changed_pixels:
+        diff_image = _heatmap(bse_img, delta)
+    return DiffResult(is_same, changed_pixels, changed_percent, int(delta.max()), ssim, diff_image)
+
+
+def compare_image_files(image_name_with_ext: str, color_mode: str = "RGB", **tolerances) -> DiffResult:
     base_img_pth, tst_img_pth, diff_img_pth = file_paths(image_name_with_ext)
     raise_for_missing_images(base_img_pth, tst_img_pth)
-    # Read Base Image & Test Image.
-    base_img = read_image(base_img_pth, color_mode=color_mode)
-    test_img = read_image(tst_img_pth, color_mode=color_mode)
-    raise_for_format_mismatch(base_img, test_img)
-    raise_for_size_mismatch(base_img, test_img)
-    diff_img = _diff_img(base_img, test_img)
-    if diff_img:
-        diff_img.save(diff_img_pth)
-        return False
-    return True
+    # Only the image headers are read by PIL to validate format & size
+    with Image.open(base_img_pth) as base_img, Image.open(tst_img_pth) as test_img:
+        raise_for_format_mismatch(base_img, test_img)
+        raise_for_size_mismatch(base_img, test_img)
+    result = compare_images(
+        read_image_array(base_img_pth, color_mode),
+        read_image_array(tst_img_pth, color_mode),
+        **tolerances,
+    )
+    if result.diff_image is not None:
+        diff_img_pth.parent.mkdir(parents=True, exist_ok=True)
+        cv2.imwrite(str(diff_img_pth), result.diff_image)
+    return result
+
+
+def comparison_settings_path(image_name_with_ext: str) -> Path:
+    return file_paths(f"{image_name_with_ext}{COMPARISON_SETTINGS_SUFFIX}").test
+
+
+def save_comparison_settings(image_name_with_ext: str, color_mode: str, tolerances: dict) -> None:
+    """Keeps the color mode and tolerances of a step next to its test image, for the visual batch."""
+    settings_path = comparison_settings_path(image_name_with_ext)
+    if settings_path.parent.is_dir():
+        with open(settings_path, "w", encoding="utf-8") as settings_file:
+            json.dump({"color_mode": color_mode, "tolerances": tolerances}, settings_file)
+
+
+def load_comparison_settings(image_name_with_ext: str) -> typing.Optional[dict]:
+    """Color mode and tolerances saved by the last step which compared the image, None when there are none."""
+    try:
+        with open(comparison_settings_path(image_name_with_ext), "r", encoding="utf-8") as settings_file:
+            settings = json.load(settings_file)
+    except (OSError, ValueError):
+        return None
+    tolerances = settings.get("tolerances", {})
+    if tolerances.get("ignore_regions"):
+        tolerances["ignore_regions"] = [tuple(region) for region in tolerances["ignore_regions"]]
+    return {"color_mode": settings.get("color_mode", "RGB"), "tolerances": tolerances}
+
+
+def are_images_same(image_name_with_ext: str, color_mode: str = "RGB", **tolerances) -> bool:
+    save_comparison_settings(image_name_with_ext, color_mode, tolerances)
+    return compare_image_files(image_name_with_ext, color_mode, **tolerances).is_same
@@ -1,28 +1,66 @@
 import time
+import typing
+from collections import deque, namedtuple
 from typing import Callable
 
-from main.plugin import logger
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+# Polling starts at INITIAL_POLL_INTERVAL seconds and backs off up to the given poll_frequency
+INITIAL_POLL_INTERVAL = 0.05
+BACKOFF_FACTOR = 1.5
+
+WaitMetric = namedtuple("WaitMetric", "name target elapsed attempts success")
+
+_wait_metrics: typing.Deque[WaitMetric] = deque(maxlen=10000)
+
+
+def record_wait(name: str, target, elapsed: float, attempts: int, success: bool):
+    metric = WaitMetric(name, str(target), elapsed, attempts, success)
+    _wait_metrics.append(metric)
+    logger.debug("Wait completed", wait=name, target=metric.target, elapsed=round(elapsed, 3), attempts=attempts,
+                 success=success)
+
+
+def pop_wait_metrics() -> typing.List[WaitMetric]:
+    """Returns the waits recorded since the last call and starts a new recording."""
+    metrics = list(_wait_metrics)
+    _wait_metrics.clear()
+    return metrics
 
 
 def wait_until(
     func: Callable,
     *func_args,
     max_wait_time: int = 10,
-    poll_frequency: int = 2,
+    poll_frequency: float = 2,
     **func_kwargs
 ):
-    end_time = time.time() + max_wait_time
+    start_time = time.monotonic()
+    end_time = start_time + max_wait_time
+    interval = min(INITIAL_POLL_INTERVAL, poll_frequency)
+    attempts = 0
+    last_error = None
     while True:
+        attempts += 1
         try:
             value = func(*func_args, **func_kwargs)
             if value:
+                record_wait(getattr(func, "__name__", str(func)), func_args[0] if func_args else "",
+                            time.monotonic() - start_time, attempts, True)
                 return value
-        except Exception:
-            pass
-        time.sleep(poll_frequency)
-        if time.time() > end_time:
-            logger.error(f"The element having locator '{func_args[0]}' is not visible")
+        except Exception as error:
+            last_error = error
+        remaining = end_time - time.monotonic()
+        if remaining <= 0:
+            record_wait(getattr(func, "__name__", str(func)), func_args[0] if func_args else "",
+                        time.monotonic() - start_time, attempts, False)
+            logger.error(f"The element having locator '{func_args[0] if func_args else ''}' is not visible",
+                         last_error=repr(last_error) if last_error else None)
             return False
+        time.sleep(min(interval, remaining))
+        interval = min(interval * BACKOFF_FACTOR, poll_frequency)
 
 
 def be_idle_for(seconds: int):
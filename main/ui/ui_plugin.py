@@ -1,23 +1,26 @@
 import copy
 from collections import defaultdict
 
-import allure
 import pytest
 
-from allure_commons.types import AttachmentType
-
 from pytest_bdd import parser as pytest_bdd_parser
 from selenium.webdriver.common.proxy import Proxy, ProxyType
+from selenium.webdriver.support.event_firing_webdriver import EventFiringWebDriver
+from tenacity import Retrying, stop_after_attempt, wait_exponential
 
 from main.ui.common.step_definitions import *
 from main.ui.common.utils.locator_parser import Locators
+from main.ui.common.utils.wait import pop_wait_metrics
+from main.ui.common.utils.screenshot_pipeline import get_screenshot_pipeline, close_screenshot_pipeline
+from main.ui.common.utils.session_pool import SessionPool, is_poolable_session, session_key
 
 from pytest_selenium.drivers import appium
 from pytest_selenium.drivers import remote
 
 import logging
 
-from main.utils.utils import save_base64_as_png, TEMP_SCREENSHOTS, logger
+from main.utils.screenshot_store import ScreenshotStore
+from main.utils.utils import logger
 
 from pytest_selenium import drivers, split_class_and_test_names
 from _pytest.fixtures import FixtureRequest, FixtureLookupError
@@ -34,6 +37,7 @@ def pytest_bdd_before_scenario(
 ):
     """Called before every scenario execution"""
     request.node.scenarioDict = defaultdict()
+    get_screenshot_pipeline(request.config).reset(request.node.nodeid)
     # Use built-in logger with default level warning to display only a separation line between each scenario
     blank_logger.warning("\n")
 
@@ -47,10 +51,15 @@ def pytest_bdd_after_scenario(
         feature: pytest_bdd_parser.Feature, scenario: pytest_bdd_parser.Scenario
 ):
     """Called after every scenario is executed"""
+    wait_metrics = pop_wait_metrics()
+    slowest_wait = max(wait_metrics, key=lambda metric: metric.elapsed, default=None)
     logger.info(
         "Scenario Execution Completed.",
         scenario_name=scenario.name,
         feature=feature.name,
+        waits=len(wait_metrics),
+        total_wait_time=round(sum(metric.elapsed for metric in wait_metrics), 3),
+        slowest_wait=f"{slowest_wait.target} ({slowest_wait.elapsed:.3f}s)" if slowest_wait else None,
     )
 
 
@@ -67,28 +76,25 @@ def pytest_bdd_after_step(
         step=step.name,
     )
     driver_ = request.getfixturevalue("selenium")
-    if driver_:
-        allure.attach(driver_.get_screenshot_as_png(), name="Screenshot Step : " + step.name,
-                      attachment_type=AttachmentType.PNG)
+    screenshot_pipeline = get_screenshot_pipeline(request.config)
+    if driver_ and screenshot_pipeline.should_capture(request.node.nodeid):
+        screenshot_pipeline.capture(driver_, request.node.nodeid, "Screenshot Step : " + step.name)
 
     if "I take a screenshot" in step.name:
         if driver_:
-            screenshot_source = driver_.get_screenshot_as_base64()
-            dest_folder = Path(os.path.join(Path.cwd().resolve(), TEMP_SCREENSHOTS))
-            file_name = f"{request.node.name}_{str(step.line_number)}.png"
-            save_base64_as_png(data=screenshot_source, dest_folder=dest_folder,
-                               dest_file_name=file_name)
+            # only the digest of the screenshot is kept in the cache, the PNG itself lives in the store
+            screenshot_digest = ScreenshotStore().put(driver_.get_screenshot_as_png())
             scenario_cache = request.config.cache.get(f"{feature.name}/{scenario.name}", None)
             if scenario_cache and isinstance(scenario_cache, dict):
                 if request.node.name not in scenario_cache:
-                    scenario_cache[request.node.name] = [screenshot_source]
+                    scenario_cache[request.node.name] = [screenshot_digest]
                     request.config.cache.set(f"{feature.name}/{scenario.name}", scenario_cache)
                 elif scenario_cache.get(request.node.name, None):
-                    scenario_cache.get(request.node.name, []).append(screenshot_source)
+                    scenario_cache.get(request.node.name, []).append(screenshot_digest)
                     request.config.cache.set(f"{feature.name}/{scenario.name}", scenario_cache)
             else:
                 request.config.cache.set(f"{feature.name}/{scenario.name}",
-                                         {f"{request.node.name}": [screenshot_source]})
+                                         {f"{request.node.name}": [screenshot_digest]})
 
 
 def pytest_bdd_step_error(request: FixtureRequest,
@@ -99,8 +105,15 @@ def pytest_bdd_step_error(request: FixtureRequest,
 
     driver_ = request.getfixturevalue("selenium")
     if driver_:
-        allure.attach(driver_.get_screenshot_as_png(), name="Screenshot Step : " + step.name,
-                      attachment_type=AttachmentType.PNG)
+        get_screenshot_pipeline(request.config).capture(driver_, request.node.nodeid,
+                                                        "Screenshot Step : " + step.name, dedupe=False)
+
+
+# Queued step screenshots are flushed before any session finish hook generates the reports
+@pytest.hookimpl(hookwrapper=True)
+def pytest_sessionfinish(session):
+    close_screenshot_pipeline(session.config)
+    yield
 
 
 # Define chrome options as a fixture
@@ -386,11 +399,68 @@ def configure_driver_executor(session_capabilities, driver_options_factory):
         remote.driver_kwargs = driver_kwargs
 
 
+def _create_driver(request, driver_class, driver_kwargs):
+    # Same driver initialisation as the pytest-selenium driver fixture
+    retries = int(request.config.getini("max_driver_init_attempts"))
+    for retry in Retrying(stop=stop_after_attempt(retries), wait=wait_exponential(), reraise=True):
+        with retry:
+            logger.info(f"Driver init, attempt {retry.retry_state.attempt_number}/{retries}")
+            driver_ = driver_class(**driver_kwargs)
+
+    event_listener = request.config.getoption("event_listener")
+    if event_listener is not None:
+        mod_name, class_name = event_listener.rsplit(".", 1)
+        mod = __import__(mod_name, fromlist=[class_name])
+        event_listener = getattr(mod, class_name)
+        if not isinstance(driver_, EventFiringWebDriver):
+            driver_ = EventFiringWebDriver(driver_, event_listener())
+    return driver_
+
+
+class SessionPoolPlugin:
+    """Registered with --reuse-sessions only: overrides the pytest-selenium driver fixture to take the browser
+    sessions from a pool kept alive between the scenarios."""
+
+    @pytest.fixture(scope="session")
+    def session_pool(self, request):
+        pool = SessionPool(max_reuse=request.config.getoption("session_max_reuse"))
+        yield pool
+        pool.close()
+
+    @pytest.fixture
+    def driver(self, request, driver_class, driver_kwargs):
+        options = driver_kwargs.get("options", None)
+        capabilities = options.to_capabilities() if options is not None else driver_kwargs.get("capabilities") or {}
+        if not is_poolable_session(capabilities):
+            driver_ = _create_driver(request, driver_class, driver_kwargs)
+            request.node._driver = driver_
+            yield driver_
+            driver_.quit()
+            return
+
+        pool: SessionPool = request.getfixturevalue("session_pool")
+        driver_ = pool.acquire(
+            session_key(request.config.getoption("driver"), driver_kwargs),
+            lambda: _create_driver(request, driver_class, driver_kwargs),
+        )
+        request.node._driver = driver_
+        yield driver_
+        # a session which went through a failed scenario may be left in an unknown state
+        rep_call = getattr(request.node, "rep_call", None)
+        pool.release(driver_, discard=rep_call is None or rep_call.failed)
+
+
+def pytest_configure(config):
+    # the plugin is registered after pytest-selenium, so its driver fixture takes precedence
+    if config.getoption("reuse_sessions") and not config.pluginmanager.has_plugin("session_pool"):
+        config.pluginmanager.register(SessionPoolPlugin(), "session_pool")
+
+
 # Define selenium generics as a fixture
 # This is UI specific implementation
 @pytest.fixture
-def selenium_generics(selenium) -> SeleniumGenerics:
-    return SeleniumGenerics(selenium)
+def selenium_generics(selenium, request) -> SeleniumGenerics:
+    return SeleniumGenerics(selenium, in_browser_waits=request.config.getoption("in_browser_waits"))
 
 
 # Define the locators in case of specific path to the locators values
@@ -0,0 +1,86 @@
+import argparse
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import typing
+from pathlib import Path
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+__all__ = ["results_fingerprint", "generate_allure_report", "start_allure_report", "main"]
+
+FINGERPRINT_FILE_NAME = ".results_fingerprint"
+LOG_FILE_NAME = "allure_generate.log"
+
+
+def results_fingerprint(results_dir: Path) -> str:
+    """Changes whenever a result file is added, removed or rewritten."""
+    digest = hashlib.sha1()
+    with os.scandir(results_dir) as entries:
+        for entry in sorted(entries, key=lambda entry: entry.name):
+            if entry.is_file():
+                stat = entry.stat()
+                digest.update(f"{entry.name}:{stat.st_size}:{stat.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def generate_allure_report(results_dir: typing.Union[str, Path], report_dir: typing.Union[str, Path]) -> bool:
+    """Generates the report unless it was already generated from the same results.
+    The report is generated next to the previous one and swapped in once complete."""
+    results_dir, report_dir = Path(results_dir), Path(report_dir)
+    allure = shutil.which("allure")
+    if allure is None:
+        logger.warning("Allure command line not found, the Allure report is not generated")
+        return False
+    if not results_dir.is_dir():
+        logger.warning("No Allure results found", results=str(results_dir))
+        return False
+
+    fingerprint = results_fingerprint(results_dir)
+    fingerprint_file = report_dir / FINGERPRINT_FILE_NAME
+    if fingerprint_file.exists() and fingerprint_file.read_text() == fingerprint:
+        logger.info("Allure results unchanged, the report is up to date", report=str(report_dir))
+        return True
+
+    tmp_report_dir = report_dir.with_name(f"{report_dir.name}.{os.getpid()}.tmp")
+    result = subprocess.run([allure, "generate", str(results_dir), "-o", str(tmp_report_dir), "--clean"],
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    if result.returncode != 0:
+        logger.error("Allure report generation failed", output=result.stdout)
+        shutil.rmtree(tmp_report_dir, ignore_errors=True)
+        return False
+    (tmp_report_dir / FINGERPRINT_FILE_NAME).write_text(fingerprint)
+    shutil.rmtree(report_dir, ignore_errors=True)
+    os.replace(tmp_report_dir, report_dir)
+    logger.info("Allure report has been generated", report=str(report_dir))
+    return True
+
+
+def start_allure_report(results_dir: typing.Union[str, Path], report_dir: typing.Union[str, Path]) -> subprocess.Popen:
+    """Generates the report in a detached process, which keeps running after pytest exits."""
+    report_dir = Path(report_dir)
+    report_dir.parent.mkdir(parents=True, exist_ok=True)
+    with open(report_dir.parent / LOG_FILE_NAME, "w", encoding="utf-8") as log_file:
+        return subprocess.Popen(
+            [sys.executable, "-m", "main.utils.allure_report", "--results", str(results_dir), "--report", str(report_dir)],
+            stdout=log_file,
+            stderr=subprocess.STDOUT,
+            stdin=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+
+
+def main(argv: typing.Optional[typing.List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate the Allure report when its results have changed")
+    parser.add_argument("--results", required=True, help="Allure results folder")
+    parser.add_argument("--report", required=True, help="Allure report folder")
+    args = parser.parse_args(argv)
+    return 0 if generate_allure_report(args.results, args.report) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
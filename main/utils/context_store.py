@@ -0,0 +1,100 @@
+import os
+import re
+import typing
+from collections import ChainMap
+from pathlib import Path
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+__all__ = ["ContextStore", "context_store", "write_local_env"]
+
+SCOPES = ("scenario", "session")
+LOCAL_ENV_FILE = Path.cwd() / "env_configs" / ".local.env"
+
+
+class ContextStore:
+    """Variables passed between the steps, in place of os.environ.
+
+    Lookups go through the scenario variables, then the session variables and finally the process
+    environment, which is never written. Each scenario starts from an empty layer over the session
+    variables, so nothing is copied and its variables are dropped when it ends. Each xdist worker has
+    its own store.
+    """
+
+    def __init__(self, default_scope: str = "scenario"):
+        self.default_scope = default_scope
+        self._session = {}
+        self._scenario = {}
+        self._variables = ChainMap(self._scenario, self._session, os.environ)
+        # values to write to the .local.env file, see write_local_env
+        self._local_env_updates = {}
+
+    def begin_scenario(self) -> None:
+        self._scenario = {}
+        self._variables = ChainMap(self._scenario, self._session, os.environ)
+
+    def end_scenario(self) -> None:
+        self._scenario.clear()
+
+    def set(self, key: str, value: typing.Any, scope: str = None) -> None:
+        scope = scope or self.default_scope
+        if scope not in SCOPES:
+            raise ValueError(f"Unknown scope '{scope}', expected one of {SCOPES}")
+        (self._session if scope == "session" else self._scenario)[key] = value
+        logger.debug("Variable stored", key=key, scope=scope)
+
+    def get(self, key: str, default: typing.Any = None) -> typing.Any:
+        return self._variables.get(key, default)
+
+    def __getitem__(self, key: str) -> typing.Any:
+        return self._variables[key]
+
+    def __setitem__(self, key: str, value: typing.Any) -> None:
+        self.set(key, value)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._variables
+
+    def snapshot(self) -> ChainMap:
+        """Copy-on-write view of the current variables: writing to it does not change the store."""
+        return self._variables.new_child()
+
+    def save_to_local_env(self, key: str) -> None:
+        """Queue the current value of the variable, the .local.env file is written once at the end of the session."""
+        value = self.get(key)
+        if value is None or value == "":
+            raise KeyError(f"Environment variable: {key} does not exits")
+        self._local_env_updates[key] = str(value)
+
+    def pop_local_env_updates(self) -> typing.Dict[str, str]:
+        updates, self._local_env_updates = self._local_env_updates, {}
+        return updates
+
+
+def write_local_env(updates: typing.Dict[str, str], local_env_file: Path = LOCAL_ENV_FILE) -> None:
+    """Writes all the updates to the .local.env file at once: the existing keys are replaced in place,
+    the others are appended."""
+    if not updates:
+        return
+    lines = local_env_file.read_text(encoding="utf-8").splitlines() if local_env_file.is_file() else []
+    pending = dict(updates)
+    for index, line in enumerate(lines):
+        match = re.match(r"\s*(?:export\s+)?([A-Za-z_][A-Za-z0-9_.-]*)\s*=", line)
+        if match and match.group(1) in pending:
+            key = match.group(1)
+            lines[index] = _local_env_line(key, pending.pop(key))
+    lines.extend(_local_env_line(key, value) for key, value in pending.items())
+    tmp_file = local_env_file.with_name(f"{local_env_file.name}.{os.getpid()}.tmp")
+    tmp_file.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    os.replace(tmp_file, local_env_file)
+    logger.info("Variables saved to the local env file", file=str(local_env_file), keys=sorted(updates))
+
+
+def _local_env_line(key: str, value: str) -> str:
+    # quoted the same way as dotenv.set_key
+    return "{}='{}'".format(key, value.replace("'", "\\'"))
+
+
+context_store = ContextStore()
@@ -1,21 +1,73 @@
-import os
 import re
+from functools import lru_cache
 
-from main.utils.dataset_handler import DatasetHandler
+from faker import Faker
+
+from main.utils.context_store import context_store
+from main.utils.dataset_handler import DatasetHandler, DatasetPath
+from main.utils.exceptions import DatasetHandlerException
+
+# {%VARIABLE%} (context store, then environment), {$faker_generator$} and {file_name:key~nested_key}
+# placeholders, found in a single scan
+PLACEHOLDER_PATTERN = re.compile(
+    r"\{%(?P<env>[0-9a-zA-Z_-]+)%\}"
+    r"|\{\$(?P<faker>[a-zA-Z_][0-9a-zA-Z_]*)\$\}"
+    r"|\{\s*(?P<file>[0-9a-zA-Z_-]+)\s*:(?P<keys>[^{}]*)\}"
+)
+
+_faker = None
+
+
+@lru_cache(maxsize=4096)
+def compile_text(string_to_format: str) -> tuple:
+    """Splits the text into literal strings and ("env" | "faker" | "dataset", argument) placeholders."""
+    parts, position = [], 0
+    for match in PLACEHOLDER_PATTERN.finditer(string_to_format):
+        if match.start() > position:
+            parts.append(string_to_format[position:match.start()])
+        if match.group("env") is not None:
+            parts.append(("env", match.group("env")))
+        elif match.group("faker") is not None:
+            parts.append(("faker", match.group("faker")))
+        else:
+            keys = tuple(key.strip() for key in match.group("keys").split("~"))
+            parts.append(("dataset", DatasetPath(match.group("file"), keys)))
+        position = match.end()
+    if position < len(string_to_format):
+        parts.append(string_to_format[position:])
+    return tuple(parts)
+
+
+def _fake(generator: str):
+    global _faker
+    if _faker is None:
+        _faker = Faker()
+    try:
+        return getattr(_faker, generator)()
+    except AttributeError:
+        raise DatasetHandlerException(f"Unknown faker generator '{generator}'")
+
+
+def _render_placeholder(kind: str, argument):
+    if kind == "env":
+        return context_store.get(argument, "")
+    if kind == "faker":
+        return _fake(argument)
+    return DatasetHandler().resolve(argument)
+
+
+def render_text(string_to_format: str):
+    """Replaces the placeholders of the text. A text made of a single placeholder returns its value as is."""
+    if "{" not in string_to_format:
+        return string_to_format
+    parts = compile_text(string_to_format)
+    if len(parts) == 1 and isinstance(parts[0], tuple):
+        return _render_placeholder(*parts[0])
+    return "".join(part if isinstance(part, str) else str(_render_placeholder(*part)) for part in parts)
 
 
 def text_formatted(string_to_format: str):
     if string_to_format is not None:
         type_ = type(string_to_format)
-        string_to_format = str(string_to_format)
-        re_var = r"{%[0-9a-zA-Z_-]+%}"
-        matches = re.findall(re_var, string_to_format)
-        if len(matches) == 0:
-            dataset = DatasetHandler()
-            string_to_format = dataset.parse_and_get(string_to_format)
-        else:
-            for match in matches:
-                match_ = match[2:-2]
-                string_to_format = string_to_format.replace(match, os.environ.get(match_, ""))
-        return type_(string_to_format)
+        return type_(render_text(str(string_to_format)))
     return string_to_format
@@ -0,0 +1,86 @@
+import csv
+import os
+import typing
+from pathlib import Path
+
+import structlog
+from openpyxl.reader.excel import load_workbook
+from openpyxl.utils.cell import coordinate_to_tuple
+
+logger = structlog.get_logger(__name__)
+
+__all__ = ["DataSource", "get_data_source"]
+
+# the csv dialect is sniffed from the beginning of the file only
+CSV_SNIFF_SIZE = 64 * 1024
+
+# {absolute path: ((mtime_ns, size), data source)}
+_data_sources = {}
+
+
+class DataSource:
+    """Rows of a csv file or of the sheets of an excel file, read once in streaming (read-only) mode.
+    Each sheet is only read the first time it is used."""
+
+    def __init__(self, file_path: typing.Union[str, Path]):
+        self.path = Path(file_path)
+        self.is_csv = self.path.suffix.lower() == ".csv"
+        self._sheets: typing.Dict[typing.Optional[str], typing.List[tuple]] = {}
+        self._key_values: typing.Dict[typing.Optional[str], typing.Dict] = {}
+
+    def rows(self, sheet_name: str = None) -> typing.List[tuple]:
+        """Rows starting from A1, for the csv files the sheet name is ignored."""
+        sheet_key = None if self.is_csv else sheet_name
+        if sheet_key not in self._sheets:
+            self._sheets[sheet_key] = self._read_csv() if self.is_csv else self._read_sheet(sheet_name)
+        return self._sheets[sheet_key]
+
+    def cell(self, coordinate: str, sheet_name: str = None):
+        """Value of the cell (e.g. 'B3'), None when it is empty."""
+        row, column = coordinate_to_tuple(coordinate.strip().upper())
+        rows = self.rows(sheet_name)
+        if row > len(rows) or column > len(rows[row - 1]):
+            return None
+        return rows[row - 1][column - 1]
+
+    def key_values(self, sheet_name: str = None) -> typing.Dict:
+        """{key: value} of the first non empty column and the column next to it.
+        The rows without a key or without a value are skipped."""
+        sheet_key = None if self.is_csv else sheet_name
+        if sheet_key not in self._key_values:
+            rows = self.rows(sheet_name)
+            first_column = min((index for row in rows for index, value in enumerate(row) if value), default=None)
+            if first_column is None:
+                raise ValueError(f"No data found in {self.path}")
+            pairs = (row[first_column:first_column + 2] for row in rows)
+            self._key_values[sheet_key] = {pair[0]: pair[1] for pair in pairs if len(pair) == 2 and pair[0] and pair[1]}
+        return self._key_values[sheet_key]
+
+    def _read_csv(self) -> typing.List[tuple]:
+        with open(self.path, newline="") as file:
+            delimiter = csv.Sniffer().sniff(file.read(CSV_SNIFF_SIZE)).delimiter
+            file.seek(0)
+            rows = [tuple(row) for row in csv.reader(file, delimiter=delimiter)]
+        logger.debug("Csv file loaded", file=str(self.path), rows=len(rows))
+        return rows
+
+    def _read_sheet(self, sheet_name: str) -> typing.List[tuple]:
+        workbook = load_workbook(self.path, read_only=True)
+        try:
+            sheet = workbook[sheet_name] if sheet_name else workbook.active
+            rows = list(sheet.iter_rows(min_row=1, min_col=1, values_only=True))
+        finally:
+            workbook.close()
+        logger.debug("Excel sheet loaded", file=str(self.path), sheet=sheet_name, rows=len(rows))
+        return rows
+
+
+def get_data_source(file_path: typing.Union[str, Path]) -> DataSource:
+    """Data source of the file, read again only when the file has changed."""
+    file_path = Path(file_path).absolute()
+    stat = os.stat(file_path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = _data_sources.get(file_path)
+    if cached is None or cached[0] != signature:
+        cached = _data_sources[file_path] = (signature, DataSource(file_path))
+    return cached[1]
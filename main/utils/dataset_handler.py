@@ -1,35 +1,119 @@
+import copy
 import re
-from collections import deque
+from collections import namedtuple
+from functools import lru_cache
+from pathlib import Path
 
 from main.utils.exceptions import DatasetHandlerException
 from main.utils.singleton import SingletonMeta
 
+# "{file_name:key~nested_key}" templates compiled into the dataset file name and the path of keys
+DatasetPath = namedtuple("DatasetPath", "file_name keys")
+
+TEMPLATE_PATTERN = re.compile("{(.*?)}")
+FILE_NAME_PATTERN = re.compile("[0-9a-zA-Z_-]+")
+
+
+@lru_cache(maxsize=4096)
+def compile_template(string_to_format: str):
+    """Returns the DatasetPath of the template, or None when the string is not a template."""
+    if TEMPLATE_PATTERN.search(string_to_format) is None:
+        return None
+    file_name = string_to_format[1:string_to_format.find(":") + 1]
+    file_name_match = FILE_NAME_PATTERN.search(file_name)
+    keys = TEMPLATE_PATTERN.search(string_to_format.replace(file_name, ""))
+    if not file_name.endswith(":") or file_name_match is None or keys is None:
+        raise DatasetHandlerException(f"Invalid dataset template '{string_to_format}', "
+                                      "expected '{file_name:key~nested_key}'")
+    return DatasetPath(file_name_match.group(0), tuple(key.strip() for key in keys.group(1).split("~")))
+
 
 class DatasetHandler(metaclass=SingletonMeta):
     def __init__(
         self,
         dataset = None
     ) -> None:
+        self.dataset = None
+        self._dataset_key = None
+        # {file key: (stamp of the file, content)} and {file key: {keys: value}}
+        self._files = {}
+        self._values = {}
+        self.set_dataset(dataset)
+
+    def set_dataset(self, dataset) -> None:
+        """Use the dataset (fixture) of the current test. The loaded files and resolved values are kept
+        as long as the dataset prefix and folders do not change, and the files are not modified."""
         self.dataset = dataset
+        key = self._key_of(dataset)
+        if key != self._dataset_key:
+            self._dataset_key = key
+            self.clear_cache()
+        else:
+            self._drop_modified_files()
 
-    def parse_and_get(self, string_to_format: str):
-        match = re.findall("{(.*?)}", str(string_to_format))
-        if len(match) > 0:
-            if self.dataset._dataset_prefix == '':
-                raise DatasetHandlerException(
-                    "Please provide the environment of the files using '--dataset-prefix [value]' within CLI arguments")
-            file_name = string_to_format[1:string_to_format.index(":") + 1]
-            string_to_format = string_to_format.replace(file_name, '')
-            file_name = re.findall('[0-9a-zA-Z_-]+', file_name)
-            match = re.findall("{(.*?)}", str(string_to_format))
-            keys = deque(match[0].split("~"))
-            data = self.dataset[f"{self.dataset._dataset_prefix}{file_name[0]}"]
-            value = data.get(keys.popleft().strip())
-            while keys:
+    def clear_cache(self) -> None:
+        self._files.clear()
+        self._values.clear()
+
+    @staticmethod
+    def _key_of(dataset):
+        if dataset is None:
+            return None
+        datadirs = getattr(dataset, "_datadirs", None)
+        if datadirs is None:
+            return id(dataset)
+        return dataset._dataset_prefix, tuple(str(datadir) for datadir in datadirs)
+
+    def _file_stamp(self, file_key: str):
+        """mtime & size of the dataset files named file_key, None when the dataset folders are unknown."""
+        datadirs = getattr(self.dataset, "_datadirs", None)
+        if datadirs is None:
+            return None
+        stamp = []
+        for file_path in sorted(path for datadir in datadirs for path in Path(datadir).glob(f"{file_key}.*")):
+            stat = file_path.stat()
+            stamp.append((str(file_path), stat.st_mtime_ns, stat.st_size))
+        return tuple(stamp)
+
+    def _drop_modified_files(self) -> None:
+        for file_key, (stamp, _) in list(self._files.items()):
+            if stamp != self._file_stamp(file_key):
+                del self._files[file_key]
+                self._values.pop(file_key, None)
+
+    def resolve(self, dataset_path: DatasetPath):
+        """Value of the dataset path, the dictionaries and lists are copies so the callers can change them."""
+        prefix = self.dataset._dataset_prefix
+        if prefix == '':
+            raise DatasetHandlerException(
+                "Please provide the environment of the files using '--dataset-prefix [value]' within CLI arguments")
+        file_key = f"{prefix}{dataset_path.file_name}"
+        values = self._values.setdefault(file_key, {})
+        if dataset_path.keys not in values:
+            if file_key not in self._files:
+                self._files[file_key] = (self._file_stamp(file_key), self.dataset[file_key])
+            value = self._files[file_key][1].get(dataset_path.keys[0])
+            for key in dataset_path.keys[1:]:
                 try:
-                    value = value.get(keys.popleft().strip())
+                    value = value.get(key)
                 except AttributeError:
                     raise DatasetHandlerException("The provided path is not present in the specified file")
-            return value
+            values[dataset_path.keys] = value
+        value = values[dataset_path.keys]
+        return copy.deepcopy(value) if isinstance(value, (dict, list)) else value
+
+    def parse_and_get(self, string_to_format: str):
+        dataset_path = compile_template(str(string_to_format)) if "{" in str(string_to_format) else None
+        if dataset_path is not None:
+            return self.resolve(dataset_path)
         # return the initial value
         return string_to_format
+
+    def parse_and_get_table(self, data_table):
+        """Resolves every cell of a data table in one pass: a {header: [values]} or {key: value} dictionary
+        (as returned by the gherkin_utils converters) or a list of rows."""
+        if isinstance(data_table, dict):
+            return {key: self.parse_and_get_table(value) if isinstance(value, (list, dict))
+                    else self.parse_and_get(value) for key, value in data_table.items()}
+        return [self.parse_and_get_table(value) if isinstance(value, (list, dict)) else self.parse_and_get(value)
+                for value in data_table]
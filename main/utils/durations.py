@@ -0,0 +1,93 @@
+import heapq
+import json
+import os
+import statistics
+import typing
+from pathlib import Path
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+__all__ = ["DURATIONS_FILE", "load_durations", "record_duration", "save_durations", "parse_shard", "order_longest_first",
+           "split_into_shards"]
+
+# pytest.ini runs with --cache-clear, so the history is kept next to the other output_data caches
+DURATIONS_FILE = Path(os.getcwd()) / "output_data" / ".cache" / "durations.json"
+# weight of the last run in the duration history
+SMOOTHING = 0.5
+# expected duration of a test without any history, when no test has one
+DEFAULT_DURATION = 1.0
+
+_run_durations: typing.Dict[str, float] = {}
+
+
+def load_durations(file_path: Path = DURATIONS_FILE) -> typing.Dict[str, float]:
+    """{test node id: expected duration in seconds} from the previous runs."""
+    try:
+        with open(file_path, "r", encoding="utf-8") as durations_file:
+            return json.load(durations_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def record_duration(report):
+    # setup, call and teardown together, so the fixture cost (e.g. browser start) is part of the test duration.
+    # Every rerun starts again from its setup report, so only the last attempt of a flaky test is kept
+    if report.when == "setup":
+        _run_durations[report.nodeid] = report.duration
+    else:
+        _run_durations[report.nodeid] = _run_durations.get(report.nodeid, 0.0) + report.duration
+
+
+def save_durations(file_path: Path = DURATIONS_FILE):
+    """Merges the durations recorded in this run into the history."""
+    if not _run_durations:
+        return
+    history = load_durations(file_path)
+    for nodeid, duration in _run_durations.items():
+        previous = history.get(nodeid)
+        history[nodeid] = round(duration if previous is None else SMOOTHING * duration + (1 - SMOOTHING) * previous, 3)
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = file_path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_file, "w", encoding="utf-8") as durations_file:
+        json.dump(history, durations_file)
+    os.replace(tmp_file, file_path)
+    logger.debug("Test durations saved", tests=len(_run_durations), file=str(file_path))
+
+
+def parse_shard(value: str) -> typing.Tuple[int, int]:
+    """'i/N' (1 based) -> (i, N)"""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{value}', expected 'i/N' e.g. '1/4'")
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"Invalid shard '{value}', i has to be between 1 and N")
+    return index, count
+
+
+def _expected_durations(nodeids: typing.Iterable[str], durations: typing.Dict[str, float]) -> typing.Dict[str, float]:
+    known = [durations[nodeid] for nodeid in nodeids if nodeid in durations]
+    default = statistics.median(known) if known else DEFAULT_DURATION
+    return {nodeid: durations.get(nodeid, default) for nodeid in nodeids}
+
+
+def order_longest_first(nodeids: typing.List[str], durations: typing.Dict[str, float]) -> typing.List[str]:
+    """Longest processing time first; node ids without history get the median duration."""
+    expected = _expected_durations(nodeids, durations)
+    return sorted(nodeids, key=lambda nodeid: (-expected[nodeid], nodeid))
+
+
+def split_into_shards(nodeids: typing.List[str], durations: typing.Dict[str, float],
+                      count: int) -> typing.List[typing.List[str]]:
+    """Greedy LPT split: every test, longest first, goes to the shard with the least total duration.
+    Deterministic, so every CI job computes the same shards from the same history."""
+    expected = _expected_durations(nodeids, durations)
+    shards = [[] for _ in range(count)]
+    heap = [(0.0, index) for index in range(count)]
+    for nodeid in order_longest_first(nodeids, durations):
+        total, index = heapq.heappop(heap)
+        shards[index].append(nodeid)
+        heapq.heappush(heap, (total + expected[nodeid], index))
+    return shards
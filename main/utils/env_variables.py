@@ -2,6 +2,7 @@ import os
 from pathlib import Path
 from typing import Union
 from dotenv import load_dotenv
+from main.utils.context_store import context_store
 from main.utils.singleton import SingletonMeta
 
 
@@ -31,4 +32,5 @@ class EnvVariables(metaclass=SingletonMeta):
         return os.getenv("BASE_URL", "")
 
     def get(self, var_name, default=None) -> str:
-        return os.getenv(var_name, default)
+        # the variables stored by the steps first, then the environment
+        return context_store.get(var_name, default)
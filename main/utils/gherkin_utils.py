@@ -1,53 +1,157 @@
-from os import listdir, path
+import hashlib
+import importlib.metadata
+import os
+import pickle
+from functools import partial
+from os import path
+from pathlib import Path
+from typing import Dict, Iterator
 
+import numpy
 import structlog
 from gherkin.parser import Parser
 from gherkin.token_scanner import TokenScanner
 
+from main.utils.exceptions import DataTableException
+
 logger = structlog.get_logger(__name__)
 
 
+def _gherkin_version() -> str:
+    try:
+        return importlib.metadata.version("gherkin-official")
+    except importlib.metadata.PackageNotFoundError:
+        return "unknown"
+
+
+# the parsed features are only reused with the version of the parser which produced them
+GHERKIN_CACHE_DIR = Path(os.getcwd()) / "output_data" / ".cache" / "gherkin" / _gherkin_version()
+# {absolute path: ((mtime_ns, size), parsed feature)} of the features parsed by this process
+_parsed_features = {}
+
+
+class DataTable(dict):
+    """Columns of a horizontal data table by header: lists of strings, or NumPy arrays for the typed columns."""
+
+    @property
+    def header(self) -> tuple:
+        return tuple(self)
+
+    @property
+    def row_count(self) -> int:
+        return len(next(iter(self.values()))) if self else 0
+
+    def rows(self) -> Iterator[dict]:
+        for values in zip(*self.values()):
+            yield dict(zip(self, values))
+
+
+def _data_table_rows(data_table_raw: str) -> Iterator[list]:
+    for line in data_table_raw.split("\n"):
+        if line:
+            yield [cell.strip() for cell in line.split("|") if cell]
+
+
 def data_table_vertical_converter(data_table_raw: str):
-    logger.info(
-        "Vertical conversion of data table started", data_table_raw=data_table_raw
-    )
-    data_table_list = data_table_raw.split("|")
-    data_table_list = [elem.strip() for elem in data_table_list]
-    data_table_list = list(filter(lambda elem: elem != "", data_table_list))
-    vertical_conversion = {
-        data_table_list[i]: data_table_list[i + 1]
-        for i in range(0, len(data_table_list) - 1, 2)
-    }
-    logger.info("Output of data table vertical conversion is: ", vertical_conversion)
+    cells = iter([cell for cell in map(str.strip, data_table_raw.split("|")) if cell])
+    vertical_conversion = dict(zip(cells, cells))
+    logger.debug("Data table converted vertically", keys=len(vertical_conversion))
     return vertical_conversion
 
 
-def data_table_horizontal_converter(data_table_raw: str):
-    logger.info(
-        "Horizontal conversion of data table started", data_table_raw=data_table_raw
-    )
-    data_table_rows = data_table_raw.split("\n")
-    data_table_rows = [i for i in data_table_rows if i]
-    data_table_header = data_table_rows[0].split("|")
-    data_table_header = [i.strip() for i in data_table_header if i]
-    data_table = {data_table_header[i]: [] for i in range(0, len(data_table_header))}
-
-    for i in range(1, len(data_table_rows)):
-        data_table_row = data_table_rows[i].split("|")
-        data_table_row = [i.strip() for i in data_table_row if i]
-        for j in range(0, len(data_table_header)):
-            data_table[data_table_header[j]].append(data_table_row[j])
-    logger.info("Output of horizontal conversion of data table", data_table=data_table)
+def data_table_horizontal_converter(data_table_raw: str, column_types: Dict[str, type] = None) -> DataTable:
+    """Converts the table to columns, in one pass. The columns of `column_types` are converted
+    to NumPy arrays of the given type, e.g. {"quantity": int}."""
+    rows = list(_data_table_rows(data_table_raw))
+    header, rows = rows[0], rows[1:]
+    for row in rows:
+        if len(row) < len(header):
+            raise DataTableException(f"Data table row {row} has less cells than the header {header}")
+    columns = zip(*rows) if rows else ([] for _ in header)
+    data_table = DataTable()
+    for name, column in zip(header, columns):
+        dtype = column_types.get(name) if column_types else None
+        data_table[name] = numpy.asarray(column).astype(dtype) if dtype else list(column)
+    logger.debug("Data table converted horizontally", columns=len(data_table), rows=len(rows))
     return data_table
 
 
+def typed_data_table_converter(**column_types: type):
+    """Horizontal converter with typed columns, for the step converters,
+    e.g. converters=dict(data_table=typed_data_table_converter(quantity=int, price=float))"""
+    return partial(data_table_horizontal_converter, column_types=column_types)
+
+
+def iter_data_table_rows(data_table_raw: str) -> Iterator[dict]:
+    """Yields the rows of a horizontal data table as {header: value} dictionaries, one at a time."""
+    rows = _data_table_rows(data_table_raw)
+    header = next(rows, None)
+    if header is None:
+        return
+    for row in rows:
+        if len(row) < len(header):
+            raise DataTableException(f"Data table row {row} has less cells than the header {header}")
+        yield dict(zip(header, row))
+
+
+def _file_signature(file_path: str) -> tuple:
+    stat = os.stat(file_path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _cache_file(file_path: str) -> Path:
+    return GHERKIN_CACHE_DIR / f"{hashlib.sha1(file_path.encode('utf-8')).hexdigest()}.pickle"
+
+
+def _read_cached_feature(file_path: str, signature: tuple):
+    try:
+        with open(_cache_file(file_path), "rb") as handle:
+            cached_signature, feature = pickle.load(handle)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+        return None
+    return feature if cached_signature == signature else None
+
+
+def _write_cached_feature(file_path: str, signature: tuple, feature) -> None:
+    # written to a temporary file first, since xdist workers may write the same cache file
+    cache_file = _cache_file(file_path)
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_file, "wb") as handle:
+            pickle.dump((signature, feature), handle, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        logger.debug("Gherkin cache file could not be written", file=str(cache_file))
+
+
 def get_feature(file_path: str):
-    """Read and parse given feature file"""
-    logger.info("About to read feature file ", file_path)
-    file_obj = open(file_path, "r")
-    steam = file_obj.read()
-    parser = Parser()
-    return parser.parse(TokenScanner(steam))
+    """Read and parse given feature file.
+    The parsed features are cached (in memory and in output_data/.cache) until the file changes,
+    the returned feature must not be mutated."""
+    file_path = path.abspath(file_path)
+    signature = _file_signature(file_path)
+    cached = _parsed_features.get(file_path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    feature = _read_cached_feature(file_path, signature)
+    if feature is None:
+        logger.info("About to read feature file ", file_path=file_path)
+        with open(file_path, "r", encoding="utf-8") as file_obj:
+            stream = file_obj.read()
+        feature = Parser().parse(TokenScanner(stream))
+        _write_cached_feature(file_path, signature, feature)
+    _parsed_features[file_path] = (signature, feature)
+    return feature
+
+
+def _scan_files(dir_path: str, files_path: list) -> None:
+    with os.scandir(dir_path) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                _scan_files(entry.path, files_path)
+            elif entry.is_file():
+                files_path.append(entry.path)
 
 
 def get_feature_files_path(export_tests_path: str):
@@ -55,22 +159,7 @@ def get_feature_files_path(export_tests_path: str):
     tests_abs_path = path.abspath(export_tests_path)
     if path.isfile(tests_abs_path):
         return [tests_abs_path]
-    files_path = [
-        path.join(tests_abs_path, f)
-        for f in listdir(tests_abs_path)
-        if path.isfile(path.join(tests_abs_path, f))
-    ]
-    dirs_name = [
-        f
-        for f in listdir(tests_abs_path)
-        if not path.isfile(path.join(tests_abs_path, f))
-    ]
-    for dir_name in dirs_name:
-        curent_path = tests_abs_path + "/" + dir_name
-        files_path = files_path + [
-            path.join(curent_path, f)
-            for f in listdir(curent_path)
-            if path.isfile(path.join(curent_path, f))
-        ]
-    logger.info("Feature files path is", files_path)
+    files_path = []
+    _scan_files(tests_abs_path, files_path)
+    logger.info("Feature files path is", files_path=files_path)
     return files_path
@@ -0,0 +1,141 @@
+import time
+import typing
+
+import requests
+import structlog
+from xdist.scheduler import LoadScheduling
+
+from main.utils.durations import load_durations, order_longest_first
+
+logger = structlog.get_logger(__name__)
+
+__all__ = ["GridCapacity", "GridScheduling", "grid_status_url"]
+
+STATUS_TIMEOUT = 2
+# the hub is queried at most once per STATUS_TTL seconds
+STATUS_TTL = 2.0
+
+
+def grid_status_url(config) -> typing.Union[str, None]:
+    url = config.getoption("grid_status_url")
+    if url:
+        return url
+    host, port = config.getoption("selenium_host"), config.getoption("selenium_port")
+    if config.getoption("driver") == "Remote" and host:
+        return f"http://{host}:{port or 4444}/status"
+    return None
+
+
+class GridCapacity:
+    """Free and total session slots of a Selenium Grid 4 hub for one browser, read from its /status
+    endpoint. Without a hub (or when it can not be reached) the static number of slots is used."""
+
+    def __init__(self, status_url: typing.Union[str, None], browser_name: str, static_slots: int = 0):
+        self.status_url = status_url
+        self.browser_name = (browser_name or "").lower()
+        self.static_slots = static_slots
+        self._checked_at = 0.0
+        self._slots = (static_slots, static_slots)
+
+    def slots(self) -> typing.Tuple[int, int]:
+        """(free slots, total slots)"""
+        if self.status_url is None or time.monotonic() - self._checked_at < STATUS_TTL:
+            return self._slots
+        self._checked_at = time.monotonic()
+        try:
+            response = requests.get(self.status_url, timeout=STATUS_TIMEOUT)
+            response.raise_for_status()
+            self._slots = self._count_slots(response.json().get("value", {}))
+        except (requests.RequestException, ValueError) as error:
+            logger.warning("Grid status could not be read", url=self.status_url, error=str(error))
+        return self._slots
+
+    def _count_slots(self, status: dict) -> typing.Tuple[int, int]:
+        free = total = 0
+        for node in status.get("nodes", []):
+            if node.get("availability", "UP") != "UP":
+                continue
+            for slot in node.get("slots", []):
+                browser_name = slot.get("stereotype", {}).get("browserName", "").lower()
+                if self.browser_name and browser_name != self.browser_name:
+                    continue
+                total += 1
+                if not slot.get("session"):
+                    free += 1
+        return free, total
+
+
+class GridScheduling(LoadScheduling):
+    """xdist load scheduling which never runs more scenarios at once than the grid has slots.
+
+    Only as many workers as there are slots for the browser get tests; the other workers are held
+    back and started once the hub reports free slots again. Tests are dispatched longest first,
+    based on the durations of the previous runs.
+    """
+
+    def __init__(self, config, log=None, capacity: GridCapacity = None):
+        super().__init__(config, log)
+        self.capacity = capacity
+        self.active_nodes = []
+        self._activated_at = 0.0
+
+    def schedule(self):
+        assert self.collection_is_completed
+        if self.collection is not None:
+            for node in self.nodes:
+                self.check_schedule(node)
+            return
+        if not self._check_nodes_have_same_collection():
+            self.log("**Different tests collected, aborting run**")
+            return
+
+        self.collection = list(self.node2collection.values())[0]
+        index_of = {nodeid: index for index, nodeid in enumerate(self.collection)}
+        self.pending[:] = [index_of[nodeid] for nodeid in order_longest_first(self.collection, load_durations())]
+        if not self.collection:
+            return
+
+        free, total = self.capacity.slots()
+        logger.info("Grid scheduling started", url=self.capacity.status_url, browser=self.capacity.browser_name,
+                    free_slots=free, slots=total, workers=len(self.nodes))
+        # without any slot information every worker is used, like the default load scheduling
+        self._activate_nodes(free or (1 if total else len(self.nodes)))
+        self._shutdown_when_done()
+
+    def check_schedule(self, node, duration=0):
+        if node.shutting_down:
+            return
+        if node in self.active_nodes:
+            # a worker only starts its last test once it knows the next one, so two are kept pending
+            self._send_tests(node, max(2 - len(self.node2pending[node]), 0))
+        # one held back worker is started at a time, so the sessions it opens show up in the next status
+        if self.capacity.status_url and self.pending and time.monotonic() - self._activated_at >= STATUS_TTL:
+            free, _ = self.capacity.slots()
+            if free > 0:
+                self._activate_nodes(len(self.active_nodes) + 1)
+        self._shutdown_when_done()
+
+    def remove_node(self, node):
+        if node in self.active_nodes:
+            self.active_nodes.remove(node)
+        crashitem = super().remove_node(node)
+        if self.pending and not self.active_nodes:
+            self._activate_nodes(1)
+        return crashitem
+
+    def _activate_nodes(self, count: int):
+        for node in self.nodes:
+            if len(self.active_nodes) >= count or not self.pending:
+                break
+            if node in self.active_nodes or node.shutting_down:
+                continue
+            self.active_nodes.append(node)
+            self._activated_at = time.monotonic()
+            self._send_tests(node, 2)
+
+    def _shutdown_when_done(self):
+        if self.pending:
+            return
+        for node in self.nodes:
+            if not node.shutting_down:
+                node.shutdown()
@@ -1,45 +1,136 @@
-import os.path
+import os
 import pickle
+import sqlite3
+import threading
+import typing
+from pathlib import Path
 
+STORAGE_FILE = Path(os.getcwd()) / "output_data" / ".cache" / "bp_storage.sqlite"
 
-HTML_ENV_VAR_PICKLE_FILE_NAME = 'html_env_vars.pickle'
-API_BDD_RESPONSE_FILE_NAME = 'api_bdd_response.pickle'
+API_TESTING_KEY = "api_testing"
+HTML_ENV_VARS_KEY = "html_env_vars"
+API_BDD_RESPONSE_KEY = "api_bdd_response"
+
+_MISSING = object()
+
+
+class SharedStore:
+    """Key/value store shared by the pytest process and its xdist workers.
+
+    Values are pickled into a SQLite database (WAL mode, one transaction per write, so a value is
+    never read half written). Reads are served from a process-local cache, which is dropped only
+    when another process has committed a change since the last read.
+    """
+
+    def __init__(self, file_path: typing.Union[str, Path] = STORAGE_FILE):
+        self.file_path = Path(file_path)
+        self._lock = threading.RLock()
+        self._connection = None
+        self._pid = None
+        self._cache = {}
+        self._data_version = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # a connection can not be shared with a forked process
+        if self._connection is None or self._pid != os.getpid():
+            self.file_path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.file_path, timeout=30, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS storage (key TEXT PRIMARY KEY, value BLOB NOT NULL)")
+            self._connection, self._pid = connection, os.getpid()
+            self._cache.clear()
+            self._data_version = None
+        return self._connection
+
+    def _sync(self, connection: sqlite3.Connection):
+        # data_version only changes when another connection commits
+        data_version = connection.execute("PRAGMA data_version").fetchone()[0]
+        if data_version != self._data_version:
+            self._cache.clear()
+            self._data_version = data_version
+
+    def _read(self, connection: sqlite3.Connection, key: str):
+        row = connection.execute("SELECT value FROM storage WHERE key = ?", (key,)).fetchone()
+        return pickle.loads(row[0]) if row else _MISSING
+
+    def _write(self, connection: sqlite3.Connection, key: str, value):
+        connection.execute("INSERT OR REPLACE INTO storage (key, value) VALUES (?, ?)",
+                           (key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)))
+        self._cache[key] = value
+
+    def get(self, key: str, default=None):
+        with self._lock:
+            connection = self._connect()
+            self._sync(connection)
+            value = self._cache.get(key, _MISSING)
+            if value is _MISSING and key not in self._cache:
+                value = self._cache[key] = self._read(connection, key)
+            return default if value is _MISSING else value
+
+    def set(self, key: str, value):
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                self._write(connection, key, value)
+
+    def update(self, key: str, values: dict) -> dict:
+        """Merges values into the dict stored at key, in one transaction so concurrent updates are not lost."""
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                current = self._read(connection, key)
+                merged = {**(current if current is not _MISSING else {}), **values}
+                self._write(connection, key, merged)
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                self._cache.pop(key, None)
+                raise
+            return merged
+
+    def delete(self, *keys: str):
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.executemany("DELETE FROM storage WHERE key = ?", [(key,) for key in keys])
+            for key in keys:
+                self._cache[key] = _MISSING
+
+
+_store = SharedStore()
 
 
 class BPStorage:
     @staticmethod
     def is_api_testing():
-        with open('api_testing.pickle', 'rb') as handle:
-            return pickle.load(handle)
+        # read on every report hook: served from the store cache until another process changes a value
+        return bool(_store.get(API_TESTING_KEY, False))
 
     @staticmethod
     def set_api_testing(x):
-        with open('api_testing.pickle', 'wb') as handle:
-            pickle.dump(x, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        _store.set(API_TESTING_KEY, bool(x))
 
     @staticmethod
     def get_env_vars_for_html():
-        if os.path.exists(HTML_ENV_VAR_PICKLE_FILE_NAME):
-            with open(HTML_ENV_VAR_PICKLE_FILE_NAME, 'rb') as handle:
-                return pickle.load(handle)
-        else:
-            return None
+        return _store.get(HTML_ENV_VARS_KEY, None)
 
     @staticmethod
     def save_env_vars_for_html(x):
-        with open(HTML_ENV_VAR_PICKLE_FILE_NAME, 'wb') as handle:
-            pickle.dump(x, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        _store.set(HTML_ENV_VARS_KEY, x)
+
+    @staticmethod
+    def update_env_vars_for_html(x: dict):
+        return _store.update(HTML_ENV_VARS_KEY, x)
+
+    @staticmethod
+    def clear_env_vars_for_html():
+        _store.delete(HTML_ENV_VARS_KEY)
 
     @staticmethod
     def store_api_bdd_response(response):
-        with open(API_BDD_RESPONSE_FILE_NAME, 'wb') as handle:
-            pickle.dump(response, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        _store.set(API_BDD_RESPONSE_KEY, response)
 
     @staticmethod
     def get_api_bdd_response():
-        if os.path.exists('api_bdd_response.pickle'):
-            with open(API_BDD_RESPONSE_FILE_NAME, 'rb') as handle:
-                return pickle.load(handle)
-        else:
-            return None
-
+        return _store.get(API_BDD_RESPONSE_KEY, None)
@@ -0,0 +1,74 @@
+import base64
+import hashlib
+import os
+import shutil
+import tempfile
+import typing
+import zipfile
+from pathlib import Path
+
+import structlog
+
+from main.utils.utils import TEMP_SCREENSHOTS
+
+logger = structlog.get_logger(__name__)
+
+__all__ = ["ScreenshotStore"]
+
+
+class ScreenshotStore:
+    """Content-addressed store of raw PNG screenshots.
+
+    Every screenshot is saved once under the sha1 of its content, so the pytest cache and the
+    HTML report only need to keep the returned digest as a reference.
+    """
+
+    def __init__(self, root: typing.Union[str, Path, None] = None):
+        self.root = Path(root) if root else Path(os.getcwd()) / TEMP_SCREENSHOTS
+
+    def path(self, digest: str) -> Path:
+        return self.root / digest[:2] / f"{digest}.png"
+
+    def put(self, data: typing.Union[bytes, str]) -> str:
+        png = base64.b64decode(data) if isinstance(data, str) else data
+        digest = hashlib.sha1(png).hexdigest()
+        file_path = self.path(digest)
+        if not file_path.exists():
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            # write to a temporary file first, so concurrent workers never read a partial screenshot
+            fd, tmp_path = tempfile.mkstemp(dir=file_path.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as file:
+                file.write(png)
+            os.replace(tmp_path, file_path)
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        return self.path(digest).read_bytes()
+
+    def get_base64(self, digest: str) -> str:
+        return base64.b64encode(self.get(digest)).decode("ascii")
+
+    def export(self, digest: str, destination: typing.Union[str, Path]) -> Path:
+        """Places the screenshot at destination, hard linking it when the file system allows it."""
+        destination = Path(destination)
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        if destination.exists():
+            if destination.name == f"{digest}.png":
+                return destination
+            destination.unlink()
+        try:
+            os.link(self.path(digest), destination)
+        except OSError:
+            shutil.copyfile(self.path(digest), destination)
+        return destination
+
+    def zip(self, files: typing.Dict[str, str], destination: typing.Union[str, Path]) -> Path:
+        """Zips {file name: digest} straight from the store. PNG data is already compressed,
+        so the entries are stored as they are."""
+        destination = Path(destination)
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        with zipfile.ZipFile(destination, "w", compression=zipfile.ZIP_STORED) as zip_file:
+            for file_name, digest in files.items():
+                zip_file.write(self.path(digest), arcname=file_name)
+        logger.debug("Screenshots zipped", destination=str(destination), count=len(files))
+        return destination
@@ -0,0 +1,171 @@
+import json
+import time
+import typing
+from collections import Counter
+from datetime import datetime
+from html import escape
+from pathlib import Path
+
+import structlog
+
+from main.utils.screenshot_store import ScreenshotStore
+
+logger = structlog.get_logger(__name__)
+
+__all__ = ["StreamingHtmlReport"]
+
+INDEX_FILE_NAME = "index.jsonl"
+
+_HEAD = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8"/>
+<title>{title}</title>
+<style>
+body {{font-family: Helvetica, Arial, sans-serif; font-size: 12px; color: #222;}}
+table {{border-collapse: collapse; width: 100%;}}
+th, td {{border: 1px solid #e6e6e6; padding: 5px; text-align: left; vertical-align: top;}}
+tr.passed td.col-result {{color: green;}}
+tr.failed td.col-result, tr.error td.col-result {{color: red;}}
+tr.skipped td.col-result, tr.rerun td.col-result {{color: orange;}}
+pre {{white-space: pre-wrap; max-height: 400px; overflow: auto;}}
+details img {{max-width: 400px; margin: 5px; border: 1px solid #e6e6e6;}}
+#filters label {{margin-right: 10px;}}
+</style>
+</head>
+<body>
+<h1>{title}</h1>
+<p>Report generated on {started}</p>
+<div id="filters">{filters}</div>
+<table id="results-table">
+<thead><tr><th>Result</th><th>Section</th><th>Tag</th><th>Title</th><th>Duration</th><th>Links</th></tr></thead>
+<tbody>
+"""
+
+_FOOT = """</tbody>
+</table>
+<h2>Summary</h2>
+<p>{summary} in {duration:.2f} seconds</p>
+<script>
+// screenshots are only loaded once the details of their row are opened
+document.addEventListener("toggle", function (event) {{
+  if (event.target.tagName !== "DETAILS" || !event.target.open) return;
+  event.target.querySelectorAll("img[data-src]").forEach(function (img) {{
+    img.src = img.dataset.src;
+    img.removeAttribute("data-src");
+  }});
+}}, true);
+document.querySelectorAll("#filters input").forEach(function (input) {{
+  input.addEventListener("change", function () {{
+    document.querySelectorAll("#results-table tbody tr." + input.value).forEach(function (row) {{
+      row.hidden = !input.checked;
+    }});
+  }});
+}});
+</script>
+</body>
+</html>
+"""
+
+OUTCOMES = ("passed", "failed", "error", "skipped", "rerun")
+
+
+class StreamingHtmlReport:
+    """HTML report written row by row while the tests finish.
+
+    Nothing but the outcome counters is kept in memory: each result is appended to the report file
+    and to an index of its screenshots (assets/index.jsonl), and the screenshots are exported as
+    assets which the browser only loads when the row details are opened.
+    """
+
+    def __init__(self, report_path: typing.Union[str, Path], title: str = "Test Results"):
+        self.report_path = Path(report_path)
+        if not self.report_path.suffix:
+            self.report_path = self.report_path / "stream_report.html"
+        self.assets_dir = self.report_path.parent / "assets"
+        self.title = title
+        self.counts = Counter()
+        self._screenshot_store = ScreenshotStore()
+        self._started = None
+        self._report_file = None
+        self._index_file = None
+
+    def open(self):
+        self.assets_dir.mkdir(parents=True, exist_ok=True)
+        self._started = time.time()
+        filters = "".join(f'<label><input type="checkbox" value="{outcome}" checked/>{outcome}</label>'
+                          for outcome in OUTCOMES)
+        # line buffered, so every row reaches the disk as soon as it is written
+        self._report_file = open(self.report_path, "w", encoding="utf-8", buffering=1)
+        self._report_file.write(_HEAD.format(title=escape(self.title), filters=filters,
+                                             started=datetime.now().strftime("%d-%m-%Y at %H:%M:%S")))
+        self._index_file = open(self.assets_dir / INDEX_FILE_NAME, "w", encoding="utf-8", buffering=1)
+        logger.info("Streaming HTML report started", report=str(self.report_path))
+
+    def add(self, report):
+        outcome = self._outcome(report)
+        if outcome is None:
+            return
+        self.counts[outcome] += 1
+        images = [self._export(digest) for digest in getattr(report, "screenshot_digests", None) or []]
+        self._report_file.write(self._row(report, outcome, images))
+        self._index_file.write(json.dumps({"test": report.nodeid, "outcome": outcome, "images": images}) + "\n")
+
+    def close(self):
+        if self._report_file is None:
+            return
+        summary = ", ".join(f"{self.counts[outcome]} {outcome}" for outcome in OUTCOMES)
+        self._report_file.write(_FOOT.format(summary=summary, duration=time.time() - self._started))
+        self._report_file.close()
+        self._index_file.close()
+        self._report_file = self._index_file = None
+        logger.info("Streaming HTML report generated", report=str(self.report_path), results=sum(self.counts.values()))
+
+    @staticmethod
+    def _outcome(report) -> typing.Union[str, None]:
+        if report.outcome == "rerun":
+            return "rerun"
+        if report.when == "call":
+            return "skipped" if hasattr(report, "wasxfail") else report.outcome
+        # setup and teardown only get a row when they did not pass
+        if report.failed:
+            return "error"
+        if report.when == "setup" and report.skipped:
+            return "skipped"
+        return None
+
+    def _export(self, digest: str) -> str:
+        file_name = f"{digest}.png"
+        try:
+            self._screenshot_store.export(digest, self.assets_dir / file_name)
+        except OSError as error:
+            logger.warning("Screenshot could not be exported", digest=digest, error=str(error))
+        return f"assets/{file_name}"
+
+    @staticmethod
+    def _row(report, outcome: str, images: typing.List[str]) -> str:
+        scenario = getattr(report, "scenario", None)
+        section, title = "", report.nodeid
+        if isinstance(scenario, dict):
+            section = scenario.get("feature", {}).get("name", "").replace(" - ", " -> ")
+            title = scenario.get("name", title)
+        tags = sorted((tag for tag in report.keywords if isinstance(tag, str) and tag.startswith("TestCase")),
+                      reverse=True)
+        links = " ".join(
+            f'<a href="{escape(extra["content"])}" target="_blank">{escape(extra.get("name") or "")}</a>'
+            for extra in getattr(report, "extra", None) or [] if extra.get("format_type", extra.get("format")) == "url"
+        )
+        details = ""
+        if report.longreprtext or images:
+            details = (
+                "<details><summary>Details</summary>"
+                + (f"<pre>{escape(report.longreprtext)}</pre>" if report.longreprtext else "")
+                + "".join(f'<a href="{image}" target="_blank"><img data-src="{image}" alt="screenshot"/></a>'
+                          for image in images)
+                + "</details>"
+            )
+        return (
+            f'<tr class="{outcome}"><td class="col-result">{outcome.capitalize()}</td>'
+            f"<td>{escape(section)}</td><td>{escape(tags[0] if tags else '')}</td>"
+            f"<td>{escape(title)}{details}</td><td>{report.duration:.2f}</td><td>{links}</td></tr>\n"
+        )
@@ -1,10 +1,7 @@
-import base64
 import errno
 import json
 import math
-import os
 import random
-import shutil
 import string
 import time
 from collections import namedtuple
@@ -181,22 +178,3 @@ def get_random_int(end: int, start: int = 0):
 
 def remove_chars_from_string(input_str: str, chars: List):
     return input_str.translate({ord(x): '' for x in chars})
-
-
-def zip_screenshots_files(source_folder, destination_file_name, destination_folder):
-    if not os.path.exists(source_folder):
-        return ""
-    output = shutil.make_archive(
-        base_name=destination_file_name,
-        format="zip",
-        root_dir=os.path.abspath(source_folder)
-    )
-    shutil.move(output, destination_folder)
-    return output
-
-
-def save_base64_as_png(data, dest_folder, dest_file_name):
-    os.makedirs(os.path.join(dest_folder), exist_ok=True)
-    png_file = base64.b64decode(data)
-    with open(dest_folder / f"{dest_file_name}", "wb") as file:
-        file.write(png_file)